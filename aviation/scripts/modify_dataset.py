@@ -1,31 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from fuzzywuzzy import process
 
-def add_operator_country(main_csv):
-    prefix_df = pd.read_csv("./planecrash_data/registration_prefixes.csv")
-
-    for index, row in main_csv.iterrows():
-        registration = row['Registration']
-        year = int(row['Year'])
-
-        for prefix_index, prefix_row in prefix_df.iterrows():
-            period = 0
-            if not pd.isna(prefix_row['Period']):
-                period = int(str(prefix_row['Period']).rstrip('-'))
-
-            if year >= period and registration.startswith(str(prefix_row['Current Prefix'])):
-                main_csv.at[index, 'Operator Country'] = prefix_row['Country Name']
-                print(f"Row {index}: Registration = {row['Registration']}, Year = {row['Year']}, Country = {prefix_row['Country Name']}")
-                break
-            elif year < period and registration.startswith(str(prefix_row['Old Prefix'])):
-                main_csv.at[index, 'Operator Country'] = prefix_row['Country Name']
-                print(f"Row {index}: Registration = {row['Registration']}, Year = {row['Year']}, Country = {prefix_row['Country Name']}")
-                break
-    main_csv.to_csv("./planecrash_data/planecrash_dataset_with_operator_country.csv", index=False)
-
-def add_aircraft_manufacturer(main_csv):
-    accidents_df = pd.read_csv("./planecrash_data/planecrash_dataset.csv")
-    manufacturer_df = pd.read_csv("./planecrash_data/aircraft_and_manufacturers.csv")
+try:
+    from .multi_pattern import MultiPatternMatcher
+    from .registration_prefixes import RegistrationResolver
+except ImportError:
+    from multi_pattern import MultiPatternMatcher
+    from registration_prefixes import RegistrationResolver
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'planecrash_data'))
+
+ACCIDENTS_FILE = os.path.join(DATA_DIR, 'planecrash_dataset.csv')
+REGISTRATION_PREFIXES_FILE = os.path.join(DATA_DIR, 'registration_prefixes.csv')
+OPERATOR_COUNTRY_FILE = os.path.join(DATA_DIR, 'planecrash_dataset_with_operator_country.csv')
+AIRCRAFT_MANUFACTURERS_FILE = os.path.join(DATA_DIR, 'aircraft_and_manufacturers.csv')
+MANUFACTURER_LIST_FILE = os.path.join(DATA_DIR, 'manufacturer_list.csv')
+MANUFACTURERS_FILE = os.path.join(DATA_DIR, 'planecrash_dataset_with_manufacturers.csv')
+AIRCRAFT_SPECS_FILE = os.path.join(DATA_DIR, 'aircraft_specs.xlsx')
+SPECS_FILE = os.path.join(DATA_DIR, 'accidents_with_specs.csv')
+
+# Each stage adds its columns to the accidents it is given, writes them to output_file unless it is None,
+# and returns them, so the pipeline (see pipeline.py) can also run it on just the new or changed rows
+def add_operator_country(main_csv, output_file=OPERATOR_COUNTRY_FILE):
+    resolver = RegistrationResolver.from_csv(REGISTRATION_PREFIXES_FILE)
+
+    countries = resolver.resolve_many(main_csv['Registration'], main_csv['Year'])
+    matched = countries.notna().to_numpy()
+    main_csv.loc[matched, 'Operator Country'] = countries[matched].to_numpy()
+    print(f"Resolved the operator country of {int(matched.sum())} of {len(main_csv)} accidents")
+    if output_file is not None:
+        main_csv.to_csv(output_file, index=False)
+    return main_csv
+
+def build_manufacturer_list(manufacturer_list_file=MANUFACTURER_LIST_FILE):
+    manufacturer_df = pd.read_csv(AIRCRAFT_MANUFACTURERS_FILE)
 
     manufacturers = pd.concat([
     manufacturer_df['Aircraft_Manufacturer'],
@@ -38,41 +49,77 @@ def add_aircraft_manufacturer(main_csv):
 
     # Save the cleaned manufacturer list to CSV
     manufacturer_list_df = pd.DataFrame(manufacturers.sort_values().str.title(), columns=["Manufacturer"])
-    manufacturer_list_df.to_csv("./planecrash_data/manufacturer_list.csv", index=False)
-    print("Manufacturer list saved to 'manufacturer_list.csv'")
-
-    # Clean 'AC Type' and 'Operator' columns for text matching
-    accidents_df['AC Type Clean'] = accidents_df['AC Type'].fillna('').str.lower()
-    accidents_df['Operator Clean'] = accidents_df['Operator'].fillna('').str.lower()
-
-    # Matching function — checks if any manufacturer appears in AC Type or Operator (or vice versa)
-    def find_manufacturer(ac_type, operator):
-        for m in manufacturers:
-            if m in ac_type or ac_type in m or m in operator or operator in m:
-                return m.title()
-        return 'Unknown'
-
-    # Apply the matching logic to each row
-    accidents_df['Manufacturer'] = accidents_df.apply(
-        lambda row: find_manufacturer(row['AC Type Clean'], row['Operator Clean']),
-        axis=1
-    )
-
-    # Drop helper columns
-    accidents_df.drop(columns=['AC Type Clean', 'Operator Clean'], inplace=True)
+    if manufacturer_list_file is not None:
+        manufacturer_list_df.to_csv(manufacturer_list_file, index=False)
+        print("Manufacturer list saved to 'manufacturer_list.csv'")
+    return manufacturers
+
+def add_aircraft_manufacturer(main_csv, output_file=MANUFACTURERS_FILE, manufacturer_list_file=MANUFACTURER_LIST_FILE):
+    accidents_df = main_csv.copy()
+    manufacturers = build_manufacturer_list(manufacturer_list_file).tolist()
+    matcher = MultiPatternMatcher(manufacturers)
+    rank = {m: i for i, m in reversed(list(enumerate(manufacturers)))}
+
+    # Every substring of every name, mapped to the first manufacturer containing it, for the
+    # "field in manufacturer" half of the check
+    contained_in = {}
+    for i, m in enumerate(manufacturers):
+        for start in range(len(m) + 1):
+            for end in range(start, len(m) + 1):
+                contained_in.setdefault(m[start:end], i)
+
+    # Position of the first manufacturer that appears in the field or that the field appears in
+    def first_match(field):
+        found = [rank[matcher.patterns[i]] for i in matcher.find(field)]
+        return min(found + [contained_in.get(field, len(manufacturers))])
+
+    # Both columns repeat heavily, so each distinct value is matched once
+    def first_matches(column):
+        values = accidents_df[column].fillna('').str.lower()
+        ranks = {value: first_match(value) for value in values.unique()}
+        return values.map(ranks).to_numpy(dtype=np.int64)
+
+    # A row takes the first manufacturer matching either its AC Type or its Operator
+    best = np.minimum(first_matches('AC Type'), first_matches('Operator'))
+    names = np.array([m.title() for m in manufacturers] + ['Unknown'], dtype=object)
+    accidents_df['Manufacturer'] = names[best]
 
     # Save final CSV with added Manufacturer column
-    accidents_df.to_csv("./planecrash_data/planecrash_dataset_with_manufacturers.csv", index=False)
-    print("Done! Final data saved to 'accidents_with_manufacturers.csv'")
+    if output_file is not None:
+        accidents_df.to_csv(output_file, index=False)
+        print("Done! Final data saved to 'accidents_with_manufacturers.csv'")
+    return accidents_df
 
 def normalize(text):
     if pd.isna(text):
         return ""
     return str(text).lower().replace("-", "").replace(" ", "")
 
-def add_aircraft_specs(accidents_df):
+def extract_best_chunk(queries, model_list):
+    return [process.extractOne(query, model_list) for query in queries]
+
+def best_model_matches(queries, model_list, n_jobs=None, chunk_size=250, use_rapidfuzz=False):
+    # Best (model, score) per query, with chunks of queries going through fuzzywuzzy on a process pool.
+    # use_rapidfuzz scores all pairs in one call instead, which is much faster but scores differently from
+    # fuzzywuzzy, so it changes which models are matched
+    if use_rapidfuzz:
+        from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process, utils as rapid_utils
+        scores = rapid_process.cdist(queries, model_list, scorer=rapid_fuzz.WRatio,
+                                     processor=rapid_utils.default_process, workers=-1 if n_jobs is None else n_jobs)
+        best = scores.argmax(axis=1)
+        return [(model_list[j], int(round(scores[i, j]))) for i, j in enumerate(best)]
+
+    chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+    if len(chunks) > 1 and n_jobs != 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            matched_chunks = list(executor.map(extract_best_chunk, chunks, [model_list] * len(chunks)))
+    else:
+        matched_chunks = [extract_best_chunk(chunk, model_list) for chunk in chunks]
+    return [match for chunk in matched_chunks for match in chunk]
+
+def add_aircraft_specs(accidents_df, output_file=SPECS_FILE, use_rapidfuzz=False):
     # Load and clean Excel data
-    aircraft_df = pd.read_excel("./planecrash_data/aircraft_specs.xlsx", engine="openpyxl")
+    aircraft_df = pd.read_excel(AIRCRAFT_SPECS_FILE, engine="openpyxl")
 
     aircraft_df.dropna(axis=1, how='all', inplace=True)
 
@@ -82,36 +129,30 @@ def add_aircraft_specs(accidents_df):
     model_list = aircraft_df["Normalized_Model_BADA"].tolist()
     model_lookup = dict(zip(aircraft_df["Normalized_Model_BADA"], aircraft_df["Model_BADA"]))
 
-    matched_rows = []
-
-    for idx, row in accidents_df.iterrows():
-        print(idx)
-        ac_type = row["AC Type"]
-        normalized_ac = normalize(ac_type)
-
-        best_match_norm, score = process.extractOne(normalized_ac, model_list)
-        matched_row = aircraft_df[aircraft_df["Normalized_Model_BADA"] == best_match_norm]
-
-        if not matched_row.empty:
-            spec_data = matched_row.iloc[0].drop("Normalized_Model_BADA").to_dict()
-        else:
-            spec_data = {col: None for col in aircraft_df.columns if col != "Normalized_Model_BADA"}
-
-        spec_data["Matched_Model_BADA"] = model_lookup.get(best_match_norm, None)
-        spec_data["Similarity_Score"] = score
+    # AC Type strings repeat heavily, so each distinct normalized type is matched once
+    normalized_ac = accidents_df["AC Type"].apply(normalize)
+    types = normalized_ac.unique().tolist()
+    best_matches = best_model_matches(types, model_list, use_rapidfuzz=use_rapidfuzz)
 
-        matched_rows.append(spec_data)
+    # The specs of the first aircraft with each normalized model, looked up by key instead of filtered
+    spec_table = aircraft_df.drop_duplicates("Normalized_Model_BADA").set_index("Normalized_Model_BADA")
+    matched_by_type = spec_table.reindex([best_match_norm for best_match_norm, _ in best_matches])
+    matched_by_type["Matched_Model_BADA"] = [model_lookup.get(best_match_norm, None) for best_match_norm, _ in best_matches]
+    matched_by_type["Similarity_Score"] = [score for _, score in best_matches]
+    matched_by_type.index = types
 
-    matched_df = pd.DataFrame(matched_rows)
+    matched_df = matched_by_type.reindex(normalized_ac)
     final_df = pd.concat([accidents_df.reset_index(drop=True), matched_df.reset_index(drop=True)], axis=1)
 
     final_df = final_df.loc[:, ~final_df.columns.str.contains("^Unnamed")]
 
-    final_df.to_csv("./planecrash_data/accidents_with_specs.csv", index=False, encoding="utf-8")
-    print("Done! Clean output saved to 'accidents_with_specs.csv'")
+    if output_file is not None:
+        final_df.to_csv(output_file, index=False, encoding="utf-8")
+        print("Done! Clean output saved to 'accidents_with_specs.csv'")
+    return final_df
 
 def main():
-    main_csv = pd.read_csv("./planecrash_data/planecrash_dataset.csv")
+    main_csv = pd.read_csv(ACCIDENTS_FILE)
 
     add_aircraft_specs(main_csv)
     
@@ -0,0 +1,50 @@
+import re
+
+
+def build_trie_regex(patterns):
+    """Build a regex whose alternatives branch like a trie, so each position is tried once per character"""
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def to_regex(node):
+        terminal = '' in node
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Children are tried before stopping here, so the first match found is the longest one
+        return '(?:' + body + ')?' if terminal else body
+
+    return to_regex(trie)
+
+
+class MultiPatternMatcher:
+    """Find which of a fixed set of substrings occur in a text in one scan"""
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(patterns))
+        self.index = {pattern: i for i, pattern in enumerate(self.patterns)}
+        self.always_found = {self.index['']} if '' in self.index else set()
+
+        searchable = [pattern for pattern in self.patterns if pattern]
+        # A lookahead match reports the longest pattern starting at each position
+        self.regex = re.compile('(?=(' + build_trie_regex(searchable) + '))') if searchable else None
+
+        # Every pattern that is a prefix of a longest match starts at the same position, so it occurs too
+        self.prefixes = {
+            pattern: [self.index[pattern[:end]] for end in range(1, len(pattern) + 1) if pattern[:end] in self.index]
+            for pattern in searchable
+        }
+
+    def find(self, text):
+        """Return the indices (into self.patterns) of every pattern that occurs in text"""
+        found = set(self.always_found)
+        if self.regex is not None:
+            for longest in set(self.regex.findall(text)):
+                if longest:
+                    found.update(self.prefixes[longest])
+        return found
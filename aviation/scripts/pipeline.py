@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import importlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, '..', '..'))
+DATA_DIR = os.path.join(REPO_DIR, 'planecrash_data')
+BACKEND_DIR = os.path.join(REPO_DIR, 'flask_backend')
+
+STATE_FILE = os.path.join(DATA_DIR, 'pipeline_state.json')
+ROW_CACHE_DIR = os.path.join(DATA_DIR, 'pipeline_cache')
+
+
+def data_file(name):
+    return os.path.join(DATA_DIR, name)
+
+
+def import_script(name):
+    """Import a sibling script both when run as a package module and as a plain script"""
+    try:
+        return importlib.import_module(f'.{name}', __package__) if __package__ else importlib.import_module(name)
+    except ImportError:
+        if SCRIPTS_DIR not in sys.path:
+            sys.path.insert(0, SCRIPTS_DIR)
+        return importlib.import_module(name)
+
+
+def import_backend():
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    return importlib.import_module('utils')
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def update_rows(stage_name, df, context, compute):
+    """Add a row-wise stage's columns to df, computing them only for rows not seen under the same context
+
+    Rows are keyed by a hash of their values, and the derived columns of every row are kept in
+    pipeline_cache/<stage_name>.pkl. `context` should change whenever the lookup data or code changes.
+    """
+    keys = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    cache_file = os.path.join(ROW_CACHE_DIR, f'{stage_name}.pkl')
+
+    cached = None
+    if os.path.exists(cache_file):
+        saved = pd.read_pickle(cache_file)
+        if saved['context'] == context:
+            cached = saved['rows']
+
+    is_new = ~np.isin(keys, cached.index) if cached is not None else np.ones(len(df), dtype=bool)
+    print(f"{stage_name}: computing {int(is_new.sum())} of {len(df)} rows")
+
+    if is_new.any():
+        computed = compute(df[is_new].reset_index(drop=True))
+        derived = computed[[column for column in computed.columns if column not in df.columns]]
+        derived.index = keys[is_new]
+        cached = derived if cached is None else pd.concat([cached, derived])
+
+    # Only keep rows that still exist, so the cache does not grow with every scrape
+    cached = cached[~cached.index.duplicated(keep='last') & np.isin(cached.index, keys)]
+    os.makedirs(ROW_CACHE_DIR, exist_ok=True)
+    pd.to_pickle({'context': context, 'rows': cached}, cache_file + '.tmp')
+    os.replace(cache_file + '.tmp', cache_file)
+
+    result = df.copy()
+    values = cached.reindex(keys)
+    for column in cached.columns:
+        result[column] = values[column].to_numpy()
+    return result
+
+
+def write_csv(df, path, **kwargs):
+    df.to_csv(path + '.tmp', index=False, **kwargs)
+    os.replace(path + '.tmp', path)
+
+
+def stage_context(*paths):
+    return [file_hash(path) for path in paths]
+
+
+def run_operator_country():
+    modify_dataset = import_script('modify_dataset')
+    accidents = pd.read_csv(modify_dataset.ACCIDENTS_FILE)
+    context = stage_context(modify_dataset.REGISTRATION_PREFIXES_FILE, modify_dataset.__file__,
+                            os.path.join(SCRIPTS_DIR, 'registration_prefixes.py'))
+    result = update_rows('operator_country', accidents, context,
+                         lambda rows: modify_dataset.add_operator_country(rows, output_file=None))
+    write_csv(result, modify_dataset.OPERATOR_COUNTRY_FILE)
+
+
+def run_manufacturers():
+    modify_dataset = import_script('modify_dataset')
+    accidents = pd.read_csv(modify_dataset.ACCIDENTS_FILE)
+    context = stage_context(modify_dataset.AIRCRAFT_MANUFACTURERS_FILE, modify_dataset.__file__,
+                            os.path.join(SCRIPTS_DIR, 'multi_pattern.py'))
+    result = update_rows('manufacturers', accidents, context,
+                         lambda rows: modify_dataset.add_aircraft_manufacturer(rows, output_file=None,
+                                                                               manufacturer_list_file=None))
+    # The manufacturer list only depends on the vocabulary, so it is always rewritten in full
+    modify_dataset.build_manufacturer_list()
+    write_csv(result, modify_dataset.MANUFACTURERS_FILE)
+
+
+def run_specs():
+    modify_dataset = import_script('modify_dataset')
+    accidents = pd.read_csv(modify_dataset.ACCIDENTS_FILE)
+    context = stage_context(modify_dataset.AIRCRAFT_SPECS_FILE, modify_dataset.__file__)
+    result = update_rows('specs', accidents, context,
+                         lambda rows: modify_dataset.add_aircraft_specs(rows, output_file=None))
+    write_csv(result, modify_dataset.SPECS_FILE, encoding="utf-8")
+
+
+def run_geocoding(gazetteer=None, nominatim_domain=None):
+    # Resumes from the existing cache and skips known failures, so only locations of new accidents are geocoded
+    backend = import_backend()
+    from geocoding import GazetteerGeocoder, NominatimGeocoder
+    geocoder = GazetteerGeocoder(gazetteer) if gazetteer else NominatimGeocoder(domain=nominatim_domain)
+    backend.build_geocoding_cache(geocoder, retry_failed=False)
+
+
+def run_locations():
+    import_backend().build_location_columns()
+
+
+def run_clustering():
+    # Without a refit, only summaries missing from the previous output are assigned to clusters
+    summary_clustering = import_script('summary_clustering')
+    summary_clustering.clustering_main(data_file('planecrash_dataset_with_operator_country.csv'),
+                                       data_file('clustering_output.json'),
+                                       data_file('aircraft_crashes_clustered.csv'),
+                                       data_file('clustering_points.json'))
+
+
+# Stage name -> function, input files, output files and code files whose changes make the stage stale
+STAGES = {
+    'operator_country': {
+        'run': run_operator_country,
+        'inputs': ['planecrash_dataset.csv', 'registration_prefixes.csv'],
+        'outputs': ['planecrash_dataset_with_operator_country.csv'],
+        'code': ['aviation/scripts/modify_dataset.py', 'aviation/scripts/registration_prefixes.py'],
+    },
+    'manufacturers': {
+        'run': run_manufacturers,
+        'inputs': ['planecrash_dataset.csv', 'aircraft_and_manufacturers.csv'],
+        'outputs': ['planecrash_dataset_with_manufacturers.csv', 'manufacturer_list.csv'],
+        'code': ['aviation/scripts/modify_dataset.py', 'aviation/scripts/multi_pattern.py'],
+    },
+    'specs': {
+        'run': run_specs,
+        'inputs': ['planecrash_dataset.csv', 'aircraft_specs.xlsx'],
+        'outputs': ['accidents_with_specs.csv'],
+        'code': ['aviation/scripts/modify_dataset.py'],
+    },
+    'geocoding': {
+        'run': run_geocoding,
+        'inputs': ['planecrash_dataset_with_operator_country.csv'],
+        'outputs': ['geocoded_locations.csv'],
+        'code': ['flask_backend/geocoding.py'],
+    },
+    'locations': {
+        'run': run_locations,
+        'inputs': ['planecrash_dataset_with_operator_country.csv', 'geocoded_locations.csv'],
+        'outputs': ['planecrash_dataset_with_locations.csv', 'planecrash_dataset_with_locations.sources.json'],
+        'code': ['flask_backend/utils.py'],
+    },
+    'clustering': {
+        'run': run_clustering,
+        'inputs': ['planecrash_dataset_with_operator_country.csv'],
+        'outputs': ['aircraft_crashes_clustered.csv', 'clustering_output.json',
+                    'clustering_points.json', 'clustering_embeddings.npz'],
+        'code': ['aviation/scripts/summary_clustering.py'],
+    },
+}
+
+
+def stage_dependencies(stages):
+    """Stages that must finish first: those producing one of the stage's inputs"""
+    producers = {output: name for name, stage in stages.items() for output in stage['outputs']}
+    return {name: {producers[path] for path in stage['inputs'] if path in producers and producers[path] != name}
+            for name, stage in stages.items()}
+
+
+def stage_hash(name, options=None):
+    stage = STAGES[name]
+    parts = [name]
+    # e.g. geocoding with a gazetteer does not make the stage up to date for Nominatim
+    if options:
+        parts.append(json.dumps(options, sort_keys=True))
+    parts += [f"{path}:{file_hash(data_file(path))}" for path in stage['inputs']]
+    parts += [f"{path}:{file_hash(os.path.join(REPO_DIR, path))}" for path in stage['code']]
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def is_fresh(name, state, options=None):
+    outputs_exist = all(os.path.exists(data_file(path)) for path in STAGES[name]['outputs'])
+    return outputs_exist and state.get(name) == stage_hash(name, options)
+
+
+def execute_stage(name, options):
+    STAGES[name]['run'](**options)
+    return name
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE, 'r') as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_FILE + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(STATE_FILE + '.tmp', STATE_FILE)
+
+
+def run_pipeline(selected=None, force=False, max_workers=None, dry_run=False, skip=(), stage_options=None):
+    """Run the stale stages in dependency order, independent stages in parallel processes
+
+    Skipped stages are treated as up to date, so later stages use their current outputs. stage_options maps
+    a stage name to keyword arguments for its run function.
+    """
+    selected = set(selected or STAGES) - set(skip)
+    stage_options = stage_options or {}
+    dependencies = stage_dependencies(STAGES)
+    state = load_state()
+
+    pending = {name for name in STAGES if name in selected}
+    running = {}
+    done = set(STAGES) - pending
+    would_run = set()
+
+    executor = None
+    try:
+        while pending or running:
+            ready = sorted(name for name in pending if dependencies[name] <= done)
+            for name in ready:
+                pending.discard(name)
+                # Hashed only now, once upstream stages have rewritten this stage's inputs
+                options = stage_options.get(name, {})
+                if not force and not dependencies[name] & would_run and is_fresh(name, state, options):
+                    print(f"[{name}] up to date")
+                    done.add(name)
+                elif dry_run:
+                    print(f"[{name}] would run")
+                    would_run.add(name)
+                    done.add(name)
+                else:
+                    print(f"[{name}] running")
+                    if executor is None:
+                        executor = ProcessPoolExecutor(max_workers=max_workers)
+                    running[executor.submit(execute_stage, name, options)] = name
+
+            if not running:
+                if pending and not ready:
+                    raise RuntimeError(f"Stages with unmet dependencies: {sorted(pending)}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                future.result()
+                state[name] = stage_hash(name, stage_options.get(name))
+                save_state(state)
+                done.add(name)
+                print(f"[{name}] finished")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the derived planecrash_data files that are out of date")
+    parser.add_argument('stages', nargs='*', help=f"stages to consider: {', '.join(STAGES)} (default: all)")
+    parser.add_argument('--force', action='store_true', help="run the selected stages even if they are up to date")
+    parser.add_argument('--workers', type=int, default=None, help="stages to run at the same time")
+    parser.add_argument('--dry-run', action='store_true', help="only report which stages would run")
+    parser.add_argument('--skip', action='append', default=[], metavar='STAGE',
+                        help="leave a stage's outputs as they are, e.g. --skip geocoding (repeatable)")
+    parser.add_argument('--gazetteer', help="geocode offline from a location,latitude,longitude CSV instead of Nominatim")
+    parser.add_argument('--nominatim-domain', help="geocode through a self-hosted Nominatim instance")
+    args = parser.parse_args()
+    unknown = (set(args.stages) | set(args.skip)) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    if args.gazetteer and args.nominatim_domain:
+        parser.error("--gazetteer and --nominatim-domain cannot be used together")
+
+    geocoding_options = {key: value for key, value in [('gazetteer', args.gazetteer),
+                                                       ('nominatim_domain', args.nominatim_domain)] if value}
+    run_pipeline(args.stages, force=args.force, max_workers=args.workers, dry_run=args.dry_run,
+                 skip=args.skip, stage_options={'geocoding': geocoding_options})
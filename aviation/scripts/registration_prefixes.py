@@ -0,0 +1,82 @@
+import pandas as pd
+
+
+def parse_period(period):
+    """Year a prefix came into use, from values like "1972-" or "1997"; 0 when unknown"""
+    if pd.isna(period):
+        return 0
+    return int(str(period).rstrip('-'))
+
+
+class RegistrationResolver:
+    """Longest-prefix lookup of the country a registration belongs to, aware of when prefixes changed
+
+    A country's current prefix applies to accidents from its Period year on, and its old prefix to earlier
+    ones. Among prefixes of the same length, the entry listed first in the prefix table wins.
+    """
+
+    def __init__(self, prefix_df):
+        self.trie = {}
+        for order, (current, old, country, period) in enumerate(
+                prefix_df[['Current Prefix', 'Old Prefix', 'Country Name', 'Period']].itertuples(index=False)):
+            since = parse_period(period)
+            if not pd.isna(current):
+                self.add(str(current), (order, since, True, country))
+            if not pd.isna(old):
+                self.add(str(old), (order, since, False, country))
+
+    @classmethod
+    def from_csv(cls, prefix_file):
+        return cls(pd.read_csv(prefix_file))
+
+    def add(self, prefix, entry):
+        node = self.trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault('', []).append(entry)
+
+    def candidates(self, registration):
+        """Entries whose prefix starts the registration, longest prefix first"""
+        found = []
+        node = self.trie
+        for char in registration:
+            node = node.get(char)
+            if node is None:
+                break
+            if '' in node:
+                found.append(node[''])
+        return found[::-1]
+
+    @staticmethod
+    def pick(candidates, year):
+        for entries in candidates:
+            for _, since, is_current, country in entries:
+                if (year >= since) == is_current:
+                    return country
+        return None
+
+    def resolve(self, registration, year):
+        """Country of a single registration, or None"""
+        if pd.isna(registration) or pd.isna(year):
+            return None
+        return self.pick(self.candidates(str(registration)), int(year))
+
+    def resolve_many(self, registrations, years):
+        """Countries for aligned registration and year series, NaN where nothing matches
+
+        The trie is walked once per distinct registration and each distinct (registration, year) pair
+        is resolved once.
+        """
+        registrations = pd.Series(registrations).reset_index(drop=True)
+        years = pd.Series(years).reset_index(drop=True)
+        valid = registrations.notna() & years.notna()
+
+        pairs = pd.DataFrame({'registration': registrations[valid].astype(str), 'year': years[valid].astype(int)})
+        unique_pairs = pairs.drop_duplicates()
+        candidates = {registration: self.candidates(registration) for registration in unique_pairs['registration'].unique()}
+        countries = {(registration, year): self.pick(candidates[registration], year)
+                     for registration, year in unique_pairs.itertuples(index=False)}
+
+        result = pd.Series(None, index=registrations.index, dtype=object)
+        result[valid] = [countries[pair] for pair in pairs.itertuples(index=False)]
+        return result
@@ -14,10 +14,58 @@ from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.metrics import silhouette_score
 import sys
 import json
+import hashlib
+import joblib
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+try:
+    from .multi_pattern import MultiPatternMatcher
+except ImportError:
+    from multi_pattern import MultiPatternMatcher
+
+# Since nltk 3.8.2 word_tokenize reads the punkt_tab tables instead of the pickled punkt models
+if hasattr(nltk.tokenize.punkt, 'PunktTokenizer'):
+    TOKENIZER_RESOURCE = ('punkt_tab', 'tokenizers/punkt_tab/english/')
+else:
+    TOKENIZER_RESOURCE = ('punkt', 'tokenizers/punkt')
+
+# NLTK data the preprocessing loads, by download name
+NLTK_RESOURCES = dict([TOKENIZER_RESOURCE, ('stopwords', 'corpora/stopwords'), ('wordnet', 'corpora/wordnet')])
+
+
+class MissingNLTKData(LookupError):
+    """NLTK data the preprocessing needs is not installed locally"""
+
+    def __init__(self, resources):
+        self.resources = resources
+        super().__init__(f"Missing NLTK data: {', '.join(resources)}. "
+                         f"Install it with: python -m nltk.downloader {' '.join(resources)}")
+
+
+def missing_nltk_data():
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+_nltk_data_found = False
+
+
+def require_nltk_data():
+    """Check the local NLTK data once per process, raising MissingNLTKData instead of downloading anything"""
+    global _nltk_data_found
+    if not _nltk_data_found:
+        missing = missing_nltk_data()
+        if missing:
+            raise MissingNLTKData(missing)
+        _nltk_data_found = True
 
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-nltk.download('wordnet', quiet=True)
 
 unnecessary_words = ["crashed", "aircraft", "plane", "pilot", "crew", "flight", "runway", "approach", "taking", "mile",
                      "attempting", "route", "en", "ft", "due", "foot", "left", "right", "shortly", "two", "one",
@@ -149,111 +197,417 @@ CATEGORY_PRIORITY = [
     'Unclear cause'
 ]
 
-stop_words = set(stopwords.words('english')).union(custom_stopwords)
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    require_nltk_data()
+    return frozenset(stopwords.words('english')).union(custom_stopwords)
+
+
+DEFAULT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'planecrash_data', 'clustering_cache'))
+DEFAULT_CLUSTERED_CSV = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'planecrash_data', 'aircraft_crashes_clustered.csv'))
+
+CLUSTERING_PARAMS = {
+    'max_features': 1000,
+    'min_df': 1,
+    'max_df': 0.95,
+    'n_components': 20,
+    'n_clusters': 13,
+    'random_state': 50,
+    'n_init': 10,
+}
+
+# A saved model keeps assigning new accidents until they sit this much further from their
+# centroids than the training data did, or until they make up too large a share of the data
+DRIFT_THRESHOLD = 1.5
+MAX_INCREMENTAL_FRACTION = 0.2
+
+MODEL_MANIFEST_FILE = 'cluster_model.json'
+
+_lemmatizer = None
+
+
+@lru_cache(maxsize=None)
+def lemmatize_token(token):
+    """Lemmatize a token, memoized since the vocabulary is far smaller than the corpus"""
+    global _lemmatizer
+    if _lemmatizer is None:
+        require_nltk_data()
+        _lemmatizer = WordNetLemmatizer()
+    return _lemmatizer.lemmatize(token)
+
+
+def tokenize_text(text):
+    """Lowercase alphabetic tokens of a text, in order"""
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z\s]', ' ', text)
+    require_nltk_data()
+    return word_tokenize(text)
+
+
+def preprocess_text(text):
+    if not isinstance(text, str):
+        return ""
+    stop_words = get_stop_words()
+    tokens = tokenize_text(text)
+    tokens = [word for word in tokens if word not in stop_words and len(word) > 2]
+    return ' '.join(lemmatize_token(word) for word in tokens)
+
+
+def preprocess_chunk(texts):
+    return [preprocess_text(text) for text in texts]
+
+
+def summary_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def preprocessing_fingerprint():
+    """Changes whenever the stopword list changes, which invalidates cached preprocessing"""
+    return summary_hash('\n'.join(sorted(get_stop_words())))
+
+
+def rules_fingerprint():
+    """Changes whenever the category patterns or their priority change, which invalidates saved categories"""
+    return summary_hash(json.dumps([patterns, CATEGORY_PRIORITY]))
+
+
+def load_preprocess_cache(cache_file):
+    if cache_file is None or not os.path.exists(cache_file):
+        return {}
+    with open(cache_file, 'r') as f:
+        cached = json.load(f)
+    if cached.get('fingerprint') != preprocessing_fingerprint():
+        return {}
+    return cached['summaries']
+
+
+def save_preprocess_cache(cache_file, cache):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump({'fingerprint': preprocessing_fingerprint(), 'summaries': cache}, f)
+    os.replace(temp_file, cache_file)
+
+
+def preprocess_summaries(texts, cache_file=None, n_jobs=None, chunk_size=250):
+    """Preprocess summaries across a process pool, only for texts not already cached on disk by hash"""
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    keys = [summary_hash(text) for text in texts]
+
+    cache = load_preprocess_cache(cache_file)
+    pending = {key: text for key, text in zip(keys, texts) if key not in cache}
+
+    if pending:
+        pending_keys = list(pending)
+        chunks = [[pending[key] for key in pending_keys[i:i + chunk_size]]
+                  for i in range(0, len(pending_keys), chunk_size)]
+        if len(chunks) > 1 and n_jobs != 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                processed_chunks = list(executor.map(preprocess_chunk, chunks))
+        else:
+            processed_chunks = [preprocess_chunk(chunk) for chunk in chunks]
+
+        processed = [text for chunk in processed_chunks for text in chunk]
+        cache.update(zip(pending_keys, processed))
+        if cache_file is not None:
+            save_preprocess_cache(cache_file, cache)
+
+    print(f"Preprocessed {len(pending)} new summaries out of {len(texts)}")
+    return [cache[key] for key in keys]
+
+
+class CategoryScorer:
+    """Keyword and phrase patterns of every category compiled into a single matcher"""
+
+    def __init__(self, patterns):
+        self.categories = list(patterns)
+        weighted_patterns = []
+        for category_idx, pattern_dict in enumerate(patterns.values()):
+            # Keywords weigh 1, phrases weigh 2 (more important)
+            weighted_patterns += [(keyword, category_idx, 1) for keyword in pattern_dict['keywords']]
+            weighted_patterns += [(phrase, category_idx, 2) for phrase in pattern_dict['phrases']]
+
+        self.matcher = MultiPatternMatcher(pattern for pattern, _, _ in weighted_patterns)
+        # Weight each distinct pattern adds to each category when it occurs
+        self.weights = np.zeros((len(self.matcher.patterns), len(self.categories)), dtype=np.int64)
+        for pattern, category_idx, weight in weighted_patterns:
+            self.weights[self.matcher.index[pattern], category_idx] += weight
+
+    def score(self, text):
+        found = list(self.matcher.find(text.lower()))
+        return self.weights[found].sum(axis=0)
+
+    def score_many(self, texts):
+        """Score matrix with one row per text and one column per category"""
+        occurs = np.zeros((len(texts), len(self.matcher.patterns)), dtype=np.int64)
+        for row, text in enumerate(texts):
+            occurs[row, list(self.matcher.find(text.lower()))] = 1
+        return occurs @ self.weights
+
+
+_category_scorers = {}
+
+
+def get_category_scorer(patterns):
+    scorer = _category_scorers.get(id(patterns))
+    if scorer is None or scorer[0] is not patterns:
+        scorer = (patterns, CategoryScorer(patterns))
+        _category_scorers[id(patterns)] = scorer
+    return scorer[1]
 
 
 def calculate_category_scores(text, patterns):
     """Calculate score for each category based on keywords and phrases"""
-    text_lower = text.lower()
-    scores = {}
+    scorer = get_category_scorer(patterns)
+    return dict(zip(scorer.categories, scorer.score(text).tolist()))
 
-    for category, pattern_dict in patterns.items():
-        score = 0
 
-        # Score keywords (weight: 1)
-        for keyword in pattern_dict['keywords']:
-            if keyword in text_lower:
-                score += 1
+def categorize_by_rules_batch(texts, patterns=patterns):
+    """Rule-based category for every text: highest score wins, ties go to CATEGORY_PRIORITY order"""
+    scorer = get_category_scorer(patterns)
+    scores = scorer.score_many(list(texts))
 
-        # Score phrases (weight: 2 - more important)
-        for phrase in pattern_dict['phrases']:
-            if phrase in text_lower:
-                score += 2
+    max_scores = scores.max(axis=1, initial=0)
+    priority = np.array([CATEGORY_PRIORITY.index(cat) for cat in scorer.categories])
+    tied_priority = np.where(scores == max_scores[:, None], priority, len(CATEGORY_PRIORITY))
+    best = np.array(scorer.categories, dtype=object)[tied_priority.argmin(axis=1)]
 
-        scores[category] = score
+    return np.where(max_scores > 0, best, "Unclear cause")
 
-    return scores
 
+def stage_key(*parts):
+    return summary_hash(json.dumps(parts))
 
-def hybrid_clustering_approach(df, summary_column):
-    """Combine rule-based categorization with clustering validation"""
 
-    # Rule-based initial categorization
-    def categorize_by_rules(text):
-        scores = calculate_category_scores(text, patterns)
+def cached_stage(cache_dir, stage, key, compute):
+    """Load a pipeline stage's output stored under its content key, computing and storing it on a miss"""
+    if not cache_dir:
+        return compute()
+    stage_file = os.path.join(cache_dir, 'stages', f'{stage}-{key}.joblib')
+    if os.path.exists(stage_file):
+        print(f"Reusing cached {stage} stage {key[:12]}")
+        return joblib.load(stage_file)
 
-        # Filter only categories with a non-zero score
-        matched_categories = {cat: score for cat, score in scores.items() if score > 0}
+    result = compute()
+    os.makedirs(os.path.dirname(stage_file), exist_ok=True)
+    joblib.dump(result, stage_file + '.tmp')
+    os.replace(stage_file + '.tmp', stage_file)
+    return result
 
-        if not matched_categories:
-            return "Unclear cause"
-        
-        max_score = max(matched_categories.values())
 
-        tied_categories = [cat for cat, score in matched_categories.items() if score == max_score]
+def cluster_fallback_categories(rule_categories, clusters):
+    """Highest-priority clear rule-based category of each cluster, computed with a grouped reduction"""
+    clear = rule_categories != "Unclear cause"
+    priority = rule_categories.map({cat: idx for idx, cat in enumerate(CATEGORY_PRIORITY)})
+    return priority[clear].groupby(clusters[clear]).min().map(dict(enumerate(CATEGORY_PRIORITY)))
 
-        # Break tie with category priority
-        sorted_tied = sorted(tied_categories, key=lambda cat: CATEGORY_PRIORITY.index(cat))
-        return sorted_tied[0]
 
+def create_hybrid_categories(rule_categories, clusters, cluster_fallback=None):
+    """Keep clear rule-based categories; unclear ones take the highest-priority clear category of their cluster"""
+    if cluster_fallback is None:
+        cluster_fallback = cluster_fallback_categories(rule_categories, clusters)
+    fallback = clusters.map(cluster_fallback).fillna("Unclear cause")
 
-    df['rule_based_category'] = df[summary_column].apply(categorize_by_rules)
+    return rule_categories.where(rule_categories != "Unclear cause", fallback)
+
+
+def hybrid_clustering_approach(df, summary_column, cache_dir=None):
+    """Combine rule-based categorization with clustering validation"""
+
+    # Rule-based initial categorization, scored in one pass over each summary
+    df['rule_based_category'] = categorize_by_rules_batch(df[summary_column], patterns)
 
     # TF-IDF clustering for validation/refinement
-    def preprocess_text(text):
-        if not isinstance(text, str):
-            return ""
-        text = text.lower()
-        text = re.sub(r'[^a-zA-Z\s]', ' ', text)
-        tokens = word_tokenize(text)
-        tokens = [word for word in tokens if word not in stop_words and len(word) > 2]
-        lemmatizer = WordNetLemmatizer()
-        tokens = [lemmatizer.lemmatize(word) for word in tokens]
-        return ' '.join(tokens)
-
-    df['processed_summary'] = df[summary_column].apply(preprocess_text)
+    cache_file = os.path.join(cache_dir, 'processed_summaries.json') if cache_dir else None
+    df['processed_summary'] = preprocess_summaries(df[summary_column].tolist(), cache_file)
     df = df[df['processed_summary'].str.strip() != ""].reset_index(drop=True)
 
+    # Each stage is cached under a hash of its input and parameters, so changing a parameter
+    # only recomputes the stages downstream of it
+    text_key = summary_hash('\n'.join(df['processed_summary']))
+
     # Create TF-IDF vectors
-    tfidf_vectorizer = TfidfVectorizer(max_features=1000, min_df=1, max_df=0.95)
-    tfidf_matrix = tfidf_vectorizer.fit_transform(df['processed_summary'])
+    tfidf_key = stage_key(text_key, CLUSTERING_PARAMS['max_features'], CLUSTERING_PARAMS['min_df'], CLUSTERING_PARAMS['max_df'])
+
+    def fit_tfidf():
+        tfidf_vectorizer = TfidfVectorizer(max_features=CLUSTERING_PARAMS['max_features'],
+                                           min_df=CLUSTERING_PARAMS['min_df'], max_df=CLUSTERING_PARAMS['max_df'])
+        return tfidf_vectorizer, tfidf_vectorizer.fit_transform(df['processed_summary'])
+
+    tfidf_vectorizer, tfidf_matrix = cached_stage(cache_dir, 'tfidf', tfidf_key, fit_tfidf)
     tfidf_norm = normalize(tfidf_matrix)
 
-    n_components = min(20, tfidf_norm.shape[1] - 1, tfidf_norm.shape[0] - 1)
-    svd = TruncatedSVD(n_components=n_components)
-    reduced_features = svd.fit_transform(tfidf_norm)
+    n_components = min(CLUSTERING_PARAMS['n_components'], tfidf_norm.shape[1] - 1, tfidf_norm.shape[0] - 1)
+    svd_key = stage_key(tfidf_key, n_components, CLUSTERING_PARAMS['random_state'])
+
+    def fit_svd():
+        svd = TruncatedSVD(n_components=n_components, random_state=CLUSTERING_PARAMS['random_state'])
+        return svd, svd.fit_transform(tfidf_norm)
+
+    svd, reduced_features = cached_stage(cache_dir, 'svd', svd_key, fit_svd)
 
     # Save coordinates for visualization
     df['x'] = reduced_features[:, 0]
     df['y'] = reduced_features[:, 1]
 
     # K-means with 13 clusters to validate rule-based approach
-    kmeans = KMeans(n_clusters=13, random_state=50, n_init=10)
-    df['kmeans_cluster'] = kmeans.fit_predict(reduced_features)
+    kmeans_key = stage_key(svd_key, CLUSTERING_PARAMS['n_clusters'], CLUSTERING_PARAMS['random_state'], CLUSTERING_PARAMS['n_init'])
 
-    # Create hybrid categories
-    def create_hybrid_category(row):
-        rule_cat = row['rule_based_category']
-        cluster_id = row['kmeans_cluster']
+    def fit_kmeans():
+        kmeans = KMeans(n_clusters=CLUSTERING_PARAMS['n_clusters'], random_state=CLUSTERING_PARAMS['random_state'],
+                        n_init=CLUSTERING_PARAMS['n_init'])
+        return kmeans, kmeans.fit_predict(reduced_features)
 
-        if rule_cat != "Unclear cause":
-            return rule_cat
+    kmeans, df['kmeans_cluster'] = cached_stage(cache_dir, 'kmeans', kmeans_key, fit_kmeans)
 
-        cluster_mask = df['kmeans_cluster'] == cluster_id
-        cluster_rule_cats = df.loc[cluster_mask, 'rule_based_category']
-        clear_cats = cluster_rule_cats[cluster_rule_cats != "Unclear cause"]
+    cluster_fallback = cluster_fallback_categories(df['rule_based_category'], df['kmeans_cluster'])
+    df['hybrid_category'] = create_hybrid_categories(df['rule_based_category'], df['kmeans_cluster'], cluster_fallback)
+    
+    df['kmeans_cluster_interpretation'] = df['hybrid_category']
 
-        if len(clear_cats) > 0:
-            sorted_cats = sorted(clear_cats, key=lambda cat: CATEGORY_PRIORITY.index(cat))
-            return sorted_cats[0]
+    manifest = load_model_manifest(cache_dir) if cache_dir else None
+    # The cluster fallbacks depend on the rules as well, so a rule change alone also saves a new version
+    if cache_dir and (manifest is None or manifest.get('stage_key') != kmeans_key
+                      or manifest.get('rules') != rules_fingerprint()):
+        save_cluster_model(cache_dir, {
+            'vectorizer': tfidf_vectorizer,
+            'svd': svd,
+            'kmeans': kmeans,
+            'cluster_fallback': cluster_fallback.to_dict(),
+        }, train_size=len(df), train_mean_sq_distance=kmeans.inertia_ / len(df), stage_key=kmeans_key)
+
+    return df, tfidf_matrix, tfidf_vectorizer, reduced_features
+
+
+def load_model_manifest(cache_dir):
+    manifest_file = os.path.join(cache_dir, MODEL_MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, 'r') as f:
+        return json.load(f)
+
+
+def save_cluster_model(cache_dir, model, train_size, train_mean_sq_distance, stage_key=None):
+    """Save the fitted pipeline as a new numbered version and point the manifest at it"""
+    os.makedirs(cache_dir, exist_ok=True)
+    previous = load_model_manifest(cache_dir)
+    version = previous['version'] + 1 if previous else 1
+
+    model_file = f'cluster_model_v{version}.joblib'
+    joblib.dump(model, os.path.join(cache_dir, model_file))
+
+    manifest = {
+        'version': version,
+        'model_file': model_file,
+        'params': CLUSTERING_PARAMS,
+        'preprocessing': preprocessing_fingerprint(),
+        'rules': rules_fingerprint(),
+        'train_size': int(train_size),
+        'train_mean_sq_distance': float(train_mean_sq_distance),
+        'fitted_at': datetime.now(timezone.utc).isoformat(),
+        'stage_key': stage_key,
+    }
+    manifest_file = os.path.join(cache_dir, MODEL_MANIFEST_FILE)
+    with open(manifest_file + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_file + '.tmp', manifest_file)
+    print(f"Saved clustering model version {version} to {cache_dir}")
+
+
+def load_cluster_model(cache_dir):
+    """Latest saved pipeline and its manifest, or None when missing or fitted with other settings"""
+    manifest = load_model_manifest(cache_dir) if cache_dir else None
+    if manifest is None:
+        return None
+    # Categories of known accidents are reused as saved, so they must come from the current rules too
+    if (manifest['params'] != CLUSTERING_PARAMS or manifest['preprocessing'] != preprocessing_fingerprint()
+            or manifest.get('rules') != rules_fingerprint()):
+        print("Saved clustering model was fitted with different settings or category rules")
+        return None
+    model_file = os.path.join(cache_dir, manifest['model_file'])
+    if not os.path.exists(model_file):
+        return None
+    return manifest, joblib.load(model_file)
+
+
+def assign_to_clusters(df, summary_column, model, cache_dir=None):
+    """Project new accidents through a saved pipeline; also returns their mean squared centroid distance"""
+    df['rule_based_category'] = categorize_by_rules_batch(df[summary_column], patterns)
+
+    cache_file = os.path.join(cache_dir, 'processed_summaries.json') if cache_dir else None
+    df['processed_summary'] = preprocess_summaries(df[summary_column].tolist(), cache_file)
+    df = df[df['processed_summary'].str.strip() != ""].reset_index(drop=True)
+    if df.empty:
+        return df, 0.0
 
-        return "Unclear cause"
+    reduced_features = model['svd'].transform(normalize(model['vectorizer'].transform(df['processed_summary'])))
+    df['x'] = reduced_features[:, 0]
+    df['y'] = reduced_features[:, 1]
 
-    df['hybrid_category'] = df.apply(create_hybrid_category, axis=1)
-    
+    distances = model['kmeans'].transform(reduced_features)
+    df['kmeans_cluster'] = distances.argmin(axis=1)
+
+    df['hybrid_category'] = create_hybrid_categories(df['rule_based_category'], df['kmeans_cluster'],
+                                                     pd.Series(model['cluster_fallback'], dtype=object))
     df['kmeans_cluster_interpretation'] = df['hybrid_category']
 
-    return df, tfidf_matrix, tfidf_vectorizer
+    return df, float((distances.min(axis=1) ** 2).mean())
+
+
+def update_clustering_incrementally(df, summary_column, previous_output_file, cache_dir):
+    """Reuse previous results and embed only unseen accidents; returns (df, embeddings), or None when a full refit is needed"""
+    loaded = load_cluster_model(cache_dir)
+    if loaded is None or not os.path.exists(previous_output_file):
+        return None
+    manifest, model = loaded
+
+    previous = pd.read_csv(previous_output_file)
+    if summary_column not in previous.columns:
+        return None
+    # kmeans_cluster is overwritten with category ids before saving, so it is only carried along for column order
+    derived_columns = ['rule_based_category', 'processed_summary', 'x', 'y', 'kmeans_cluster',
+                       'hybrid_category', 'kmeans_cluster_interpretation']
+    if not set(derived_columns).issubset(previous.columns):
+        return None
+    previous = previous.set_index(previous[summary_column].map(summary_hash))[derived_columns]
+    previous = previous[~previous.index.duplicated()]
+
+    keys = df[summary_column].map(summary_hash)
+    is_new = ~keys.isin(previous.index)
+
+    # Summaries that preprocess to nothing are dropped from every output, so they are never found in the
+    # previous one either; they must not count as new, or they would trigger refits on every run
+    cache_file = os.path.join(cache_dir, 'processed_summaries.json') if cache_dir else None
+    processed = preprocess_summaries(df.loc[is_new, summary_column].tolist(), cache_file)
+    is_empty = pd.Series(False, index=df.index)
+    is_empty[is_new] = [text.strip() == "" for text in processed]
+    df = df[~is_empty]
+    is_new = is_new[~is_empty]
+    keys = keys[~is_empty]
+    n_new = int(is_new.sum())
+    if n_new > MAX_INCREMENTAL_FRACTION * manifest['train_size']:
+        print(f"{n_new} new accidents is too many to assign incrementally, refitting")
+        return None
+
+    known = df[~is_new]
+    known = pd.concat([known, previous.loc[keys[~is_new]].set_axis(known.index)], axis=1)
+    known['_order'] = known.index
+
+    new = df[is_new].copy()
+    new['_order'] = new.index
+    if n_new:
+        new, mean_sq_distance = assign_to_clusters(new.reset_index(drop=True), summary_column, model, cache_dir)
+        drift = mean_sq_distance / manifest['train_mean_sq_distance']
+        print(f"Assigned {len(new)} new accidents with model version {manifest['version']} (drift {drift:.2f})")
+        if drift > DRIFT_THRESHOLD:
+            print("Drift is above the threshold, refitting")
+            return None
+
+    combined = pd.concat([known, new])
+    combined = combined.sort_values('_order').drop(columns='_order').reset_index(drop=True)
+    embeddings = model['svd'].transform(normalize(model['vectorizer'].transform(combined['processed_summary'])))
+    return combined, embeddings
 
 
 def analyze_cluster_quality(df):
@@ -281,7 +635,55 @@ def analyze_cluster_quality(df):
     #             print(f"  • {row['Summary'][:150]}...")
 
 
-def clustering_main(input_file, output_file):
+def build_cluster_points(df):
+    """Build the scatter-plot point fields as columns, ready to be served by the backend"""
+    def optional_int(column, digits_only=False):
+        values = df[column] if column in df.columns else [None] * len(df)
+        return [int(v) if pd.notna(v) and (not digits_only or str(v).isdigit()) else None for v in values]
+
+    def optional_text(column, default=None):
+        values = df[column] if column in df.columns else [None] * len(df)
+        return [str(v) if pd.notna(v) else default for v in values]
+
+    return {
+        "x": df['x'].astype(float).tolist() if 'x' in df.columns else [0.0] * len(df),
+        "y": df['y'].astype(float).tolist() if 'y' in df.columns else [0.0] * len(df),
+        "kmeans_cluster": df['kmeans_cluster'].astype(int).tolist() if 'kmeans_cluster' in df.columns else [0] * len(df),
+        "kmeans_interpretation": df['kmeans_cluster_interpretation'].tolist() if 'kmeans_cluster_interpretation' in df.columns else ["Unknown"] * len(df),
+        "summary": df['Summary'].tolist() if 'Summary' in df.columns else [""] * len(df),
+        "Year": optional_int('Year'),
+        "Date": optional_text('Date'),
+        "location": optional_text('Location'),
+        "aircraft_type": optional_text('AC Type'),
+        "fatalities": optional_int('Fatalities', digits_only=True),
+        "operator": optional_text('Operator'),
+        "operator_country": optional_text('Operator Country', default="Unknown"),
+        "date": optional_text('Date')
+    }
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_embeddings(embeddings_file, accident_ids, embeddings, source_sha1=''):
+    """Save the SVD embedding of every clustered accident, keyed by its row in the input file
+
+    The ids only mean something for that exact file, so its hash is stored alongside them.
+    """
+    # Through a file object so numpy does not append .npz to temporary file names
+    with open(embeddings_file, 'wb') as f:
+        np.savez(f, accident_id=np.asarray(accident_ids, dtype=np.int64),
+                 embedding=np.asarray(embeddings, dtype=np.float32), source_sha1=np.array(source_sha1))
+
+
+def clustering_main(input_file, output_file, csv_output_file=None, points_output_file=None, cache_dir=DEFAULT_CACHE_DIR,
+                    refit=False, previous_output_file=DEFAULT_CLUSTERED_CSV, embeddings_output_file=None):
+    require_nltk_data()
     try:
         df = pd.read_csv(input_file, delimiter=',')
     except:
@@ -299,9 +701,15 @@ def clustering_main(input_file, output_file):
     else:
         summary_column = 'Summary'
 
+    # Row position in the input file, which is how the backend identifies accidents
+    df['accident_id'] = np.arange(len(df))
     df = df.dropna(subset=[summary_column]).reset_index(drop=True)
 
-    df, tfidf_matrix, vectorizer = hybrid_clustering_approach(df, summary_column)
+    updated = None if refit else update_clustering_incrementally(df, summary_column, previous_output_file, cache_dir)
+    if updated is not None:
+        df, embeddings = updated
+    else:
+        df, tfidf_matrix, vectorizer, embeddings = hybrid_clustering_approach(df, summary_column, cache_dir)
 
     analyze_cluster_quality(df)
 
@@ -337,13 +745,29 @@ def clustering_main(input_file, output_file):
         json.dump(output_data, f, indent=2)
 
     # Save CSV with all results
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_output_file = os.path.abspath(os.path.join(script_dir, '..', '..', 'planecrash_data', 'aircraft_crashes_clustered.csv'))
+    if csv_output_file is None:
+        csv_output_file = DEFAULT_CLUSTERED_CSV
     
     df['kmeans_cluster'] = df['category_id']  
     
     df.to_csv(csv_output_file, index=False)
 
+    # Save the scatter-plot payload so the backend can serve it without reparsing the CSV
+    if points_output_file is None:
+        points_output_file = os.path.join(os.path.dirname(csv_output_file), 'clustering_points.json')
+    points_data = {
+        "columns": build_cluster_points(df),
+        "distribution": df['kmeans_cluster_interpretation'].value_counts().to_dict()
+    }
+    with open(points_output_file, 'w') as f:
+        json.dump(points_data, f)
+
+    if embeddings_output_file is None:
+        embeddings_output_file = os.path.join(os.path.dirname(csv_output_file), 'clustering_embeddings.npz')
+    save_embeddings(embeddings_output_file, df['accident_id'], embeddings, source_sha1=file_sha1(input_file))
+
     print(f"\nResults saved to {csv_output_file}")
+    print(f"Point payload saved to {points_output_file}")
+    print(f"Embeddings saved to {embeddings_output_file}")
     print(f"JSON output saved to {output_file}")
     return df
\ No newline at end of file
@@ -0,0 +1,6 @@
+from utils import convert_datasets_to_arrow
+
+if __name__ == "__main__":
+    print("Converting planecrash_data CSVs to Arrow...")
+    convert_datasets_to_arrow()
+    print("Conversion complete!")
@@ -1,6 +1,18 @@
+import argparse
 from utils import build_geocoding_cache
+from geocoding import GazetteerGeocoder, NominatimGeocoder
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or resume planecrash_data/geocoded_locations.csv")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent geocoding requests")
+    parser.add_argument('--rate', type=float, default=None, help="requests per second (default: the geocoder's limit)")
+    parser.add_argument('--gazetteer', help="geocode offline from a location,latitude,longitude CSV instead of Nominatim")
+    parser.add_argument('--nominatim-domain', help="use a self-hosted Nominatim instance")
+    parser.add_argument('--skip-failed', action='store_true', help="do not retry locations that failed in an earlier run")
+    args = parser.parse_args()
+
+    geocoder = GazetteerGeocoder(args.gazetteer) if args.gazetteer else NominatimGeocoder(domain=args.nominatim_domain)
+
     print("Starting geocoding cache build...")
-    build_geocoding_cache()
-    print("Cache build complete!")
\ No newline at end of file
+    build_geocoding_cache(geocoder, max_workers=args.workers, rate=args.rate, retry_failed=not args.skip_failed)
+    print("Cache build complete!")
@@ -0,0 +1,6 @@
+from utils import build_location_columns
+
+if __name__ == "__main__":
+    print("Adding geocoded location and route columns to the accidents...")
+    build_location_columns()
+    print("Location columns complete!")
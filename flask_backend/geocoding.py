@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def clean_location(location_string):
+    """Strip qualifiers like "Near ..." and trailing parentheses that geocoders cannot resolve"""
+    location = str(location_string).strip()
+    location = re.sub(r'^(Near|Off|About)\s+', '', location, flags=re.IGNORECASE)
+    return re.sub(r'\s+\(.*?\)$', '', location)
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class NominatimGeocoder:
+    """Live geocoding through Nominatim; pass `domain` to use a self-hosted instance"""
+
+    # The public instance's usage policy allows at most one request per second
+    rate = 1.0
+
+    def __init__(self, user_agent="aviation_crashes_app", domain=None, timeout=10):
+        from geopy.geocoders import Nominatim
+        self.geolocator = Nominatim(user_agent=user_agent, domain=domain) if domain else Nominatim(user_agent=user_agent)
+        self.timeout = timeout
+
+    def geocode(self, location):
+        result = self.geolocator.geocode(clean_location(location), timeout=self.timeout)
+        if result:
+            return result.latitude, result.longitude
+        return None, None
+
+
+class GazetteerGeocoder:
+    """Offline geocoding against a CSV gazetteer with location, latitude and longitude columns"""
+
+    rate = None
+
+    def __init__(self, gazetteer_file):
+        gazetteer = pd.read_csv(gazetteer_file).dropna(subset=['location', 'latitude', 'longitude'])
+        names = gazetteer['location'].astype(str).map(lambda name: clean_location(name).lower())
+        self.coordinates = dict(zip(names, zip(gazetteer['latitude'], gazetteer['longitude'])))
+
+    def geocode(self, location):
+        return self.coordinates.get(clean_location(location).lower(), (None, None))
+
+
+def read_geocoded(*files):
+    """Coordinates already resolved in earlier (possibly partial) runs, later files winning"""
+    geocoded = {}
+    for path in files:
+        if os.path.exists(path):
+            previous = pd.read_csv(path)
+            geocoded.update(zip(previous['location'], zip(previous['latitude'], previous['longitude'])))
+    return geocoded
+
+
+def write_csv(df, path):
+    df.to_csv(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+def build_location_cache(locations, output_file, geocoder, max_workers=4, rate=None,
+                         retry_failed=True, checkpoint_every=100):
+    """Geocode the locations not yet in output_file (or its temp checkpoint) on a rate-limited thread pool"""
+    base, _ = os.path.splitext(output_file)
+    temp_file = base + '_temp.csv'
+    failed_file = base + '_failed.csv'
+
+    geocoded = read_geocoded(output_file, temp_file)
+    previously_failed = set(pd.read_csv(failed_file)['location']) if os.path.exists(failed_file) else set()
+
+    pending = [location for location in locations
+               if location not in geocoded and (retry_failed or location not in previously_failed)]
+    failed = previously_failed - set(pending) - set(geocoded)
+    print(f"{len(geocoded)} locations already geocoded, {len(pending)} to go")
+
+    bucket = TokenBucket(rate) if rate else None
+
+    def geocode_one(location):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return geocoder.geocode(location)
+        except Exception as e:
+            print(f"Geocoding error for '{location}': {e}")
+            return None, None
+
+    def checkpoint(path):
+        write_csv(pd.DataFrame([(location, lat, lng) for location, (lat, lng) in geocoded.items()],
+                               columns=['location', 'latitude', 'longitude']), path)
+        write_csv(pd.DataFrame({'location': sorted(failed)}), failed_file)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(geocode_one, location): location for location in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            location = futures[future]
+            lat, lng = future.result()
+            if lat is not None and lng is not None:
+                geocoded[location] = (lat, lng)
+                failed.discard(location)
+            else:
+                failed.add(location)
+
+            if i % checkpoint_every == 0:
+                checkpoint(temp_file)
+                print(f"Saved progress: {i}/{len(pending)} done, {len(geocoded)} successful geocodes")
+    except BaseException:
+        # Drop the queued work and keep everything finished so far for the next run to resume from
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint(temp_file)
+        raise
+    executor.shutdown()
+
+    checkpoint(output_file)
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+
+    print(f"Geocoding complete!")
+    print(f"Successfully geocoded: {len(geocoded)}")
+    print(f"Failed to geocode: {len(failed)}")
+    return pd.read_csv(output_file)
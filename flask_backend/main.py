@@ -1,22 +1,27 @@
+import time
+startup_start = time.perf_counter()
+
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from utils import get_operator_country_amount_by_range, get_list_of_manufacturers, get_number_of_accidents, get_accident_rate_per_wingspan_bin, get_all_accident_data_without_summaries, get_passenger_crew_aboard_boxplot, get_accident_rate_per_length_bin
 from utils import get_crash_locations_data_optimized, get_flight_routes_data_optimized, get_number_of_accidents_per_year, get_cluster_data, get_aircraft_specs, get_accident_rate_per_engine_amount, get_accident_rate_per_weight_class
-from utils import init_app
+from utils import init_app, conditional_get, parse_page_args, parse_bbox, get_crash_location_clusters, get_cluster_job_status
+from utils import get_similar_accidents, search_accidents
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag', 'X-Next-Cursor'])
 
-# Initialize the geocoding cache when the app starts
-print("Loading geocoding cache...")
+# Load the datasets and geocoding cache into memory when the app starts
+print("Loading datasets and geocoding cache...")
 init_app()
-print("Geocoding cache loaded successfully!")
+print(f"Datasets and geocoding cache loaded successfully in {time.perf_counter() - startup_start:.2f}s!")
 
 @app.route('/hello', methods=['GET'])
 def get_data():
     return jsonify({"message": "Hello from Flask!"})
 
 @app.route('/operator-country', methods=['GET'])
+@conditional_get
 def get_operator_country():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
@@ -27,14 +32,17 @@ def get_operator_country():
     return result
 
 @app.route('/manufacturers', methods=['GET'])
+@conditional_get
 def get_manufacturers_list():
     return jsonify(get_list_of_manufacturers())
 
 @app.route('/number_of_accidents_per_manufacturer', methods=['GET'])
+@conditional_get
 def get_number_of_accidents_per_manufacturer():
     return get_number_of_accidents()
 
 @app.route('/number_of_accidents_per_manufacturer_per_year', methods=['GET'])
+@conditional_get
 def get_number_of_accidents_per_manufacturer_per_year():
     return get_number_of_accidents_per_year()
 
@@ -46,53 +54,112 @@ def index():
 def get_cluster_data_all():
     return get_cluster_data()
 
+@app.route('/api/cluster-data/jobs/<job_id>', methods=['GET'])
+def get_cluster_data_job(job_id):
+    return get_cluster_job_status(job_id)
+
+@app.route('/api/similar/<int:accident_id>', methods=['GET'])
+def get_similar_accidents_api(accident_id):
+    k = request.args.get('k', default=10, type=int)
+    if k < 1 or k > 100:
+        return jsonify({"error": "k must be between 1 and 100"}), 400
+    return get_similar_accidents(accident_id, k)
+
 @app.route('/get_aircraft_specs', methods=['GET'])
+@conditional_get
 def get_aircraft_specs_75_similarity():
-    return get_aircraft_specs()
+    min_similarity = request.args.get('min_similarity', default=75, type=float)
+    output_format = request.args.get('format', 'json')
+    return get_aircraft_specs(min_similarity, output_format)
 
 @app.route('/get_accident_rate_engine_amount', methods=['GET'])
+@conditional_get
 def get_accident_rate_per_engine_amount_api():
-    return get_accident_rate_per_engine_amount()
+    min_similarity = request.args.get('min_similarity', default=75, type=float)
+    return get_accident_rate_per_engine_amount(min_similarity)
 
 @app.route('/get_accident_rate_weight_amount', methods=['GET'])
+@conditional_get
 def get_accident_rate_per_weight_class_api():
-    return get_accident_rate_per_weight_class()
+    min_similarity = request.args.get('min_similarity', default=75, type=float)
+    return get_accident_rate_per_weight_class(min_similarity)
 
 @app.route('/get_accident_rate_wingspan_bin', methods=['GET'])
+@conditional_get
 def get_accident_rate_per_wingspan_bin_api():
-    return get_accident_rate_per_wingspan_bin()
+    min_similarity = request.args.get('min_similarity', default=75, type=float)
+    return get_accident_rate_per_wingspan_bin(min_similarity)
 
 @app.route('/accident-data', methods=['GET'])
+@conditional_get
 def get_accident_data():
-    return get_all_accident_data_without_summaries()
+    output_format = request.args.get('format', 'json')
+    try:
+        fields, limit, cursor = parse_page_args(request.args)
+        return get_all_accident_data_without_summaries(output_format, fields, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route('/get_passenger_crew_aboard', methods=['GET'])
+@conditional_get
 def get_passenger_crew_aboard_boxplot_api():
-    return get_passenger_crew_aboard_boxplot()
+    min_similarity = request.args.get('min_similarity', default=75, type=float)
+    return get_passenger_crew_aboard_boxplot(min_similarity)
 
 @app.route('/get_accident_rate_length_bin', methods=['GET'])
+@conditional_get
 def get_accident_rate_per_length_bin_api():
-    return get_accident_rate_per_length_bin()
+    min_similarity = request.args.get('min_similarity', default=75, type=float)
+    return get_accident_rate_per_length_bin(min_similarity)
 
 @app.route('/crash-locations', methods=['GET'])
+@conditional_get
 def get_crash_locations():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     if not start_date or not end_date:
         return jsonify({"error": "Both start_date and end_date are required"}), 400
     
-    result = get_crash_locations_data_optimized(start_date, end_date)
+    zoom = request.args.get('zoom', type=int)
+    bbox = request.args.get('bbox')
+    try:
+        if zoom is not None:
+            return get_crash_location_clusters(start_date, end_date, max(zoom, 0), parse_bbox(bbox) if bbox else None)
+        fields, limit, cursor = parse_page_args(request.args)
+        result = get_crash_locations_data_optimized(start_date, end_date, fields, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return result
 
 @app.route('/flight-routes', methods=['GET'])
+@conditional_get
 def get_flight_routes():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     if not start_date or not end_date:
         return jsonify({"error": "Both start_date and end_date are required"}), 400
     
-    result = get_flight_routes_data_optimized(start_date, end_date)
+    try:
+        fields, limit, cursor = parse_page_args(request.args)
+        result = get_flight_routes_data_optimized(start_date, end_date, fields, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return result
 
+@app.route('/search', methods=['GET'])
+@conditional_get
+def search_summaries():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+
+    limit = request.args.get('limit', default=20, type=int)
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    try:
+        return search_accidents(query, request.args.get('start_date'), request.args.get('end_date'), limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
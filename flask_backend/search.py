@@ -0,0 +1,74 @@
+import re
+import math
+import numpy as np
+from collections import Counter
+
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+
+
+def parse_query(query):
+    """Split a query into its quoted phrases and the remaining loose text"""
+    return PHRASE_PATTERN.findall(query), PHRASE_PATTERN.sub(' ', query)
+
+
+class InvertedIndex:
+    """BM25-ranked inverted index over tokenized documents, with phrase matching"""
+
+    def __init__(self, documents, tokenize, k1=1.2, b=0.75):
+        self.tokenize = tokenize
+        self.doc_tokens = [tokenize(doc) if isinstance(doc, str) else [] for doc in documents]
+
+        term_docs = {}
+        term_freqs = {}
+        for doc_id, tokens in enumerate(self.doc_tokens):
+            for term, count in Counter(tokens).items():
+                term_docs.setdefault(term, []).append(doc_id)
+                term_freqs.setdefault(term, []).append(count)
+
+        n_docs = len(self.doc_tokens)
+        lengths = np.array([len(tokens) for tokens in self.doc_tokens], dtype=float)
+        avg_length = lengths.mean() if n_docs and lengths.mean() > 0 else 1.0
+
+        # Each posting stores its full BM25 contribution, so a query only sums the postings of its terms
+        self.postings = {}
+        for term, docs in term_docs.items():
+            docs = np.array(docs, dtype=np.int64)
+            freqs = np.array(term_freqs[term], dtype=float)
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights = idf * freqs * (k1 + 1) / (freqs + k1 * (1 - b + b * lengths[docs] / avg_length))
+            self.postings[term] = (docs, weights)
+
+    def contains_phrase(self, doc_id, phrase):
+        tokens = self.doc_tokens[doc_id]
+        width = len(phrase)
+        return any(tokens[i:i + width] == phrase for i in range(len(tokens) - width + 1))
+
+    def search(self, query, lo=0, hi=None):
+        """Ids and scores of the documents in [lo, hi) that match the query, best first
+
+        Loose terms are optional and only affect ranking; every quoted phrase must appear.
+        """
+        phrases, loose_text = parse_query(query)
+        phrases = [tokens for tokens in (self.tokenize(phrase) for phrase in phrases) if tokens]
+        terms = list(dict.fromkeys(self.tokenize(loose_text) + [term for phrase in phrases for term in phrase]))
+
+        matched = [self.postings[term] for term in terms if term in self.postings]
+        if not matched or any(term not in self.postings for phrase in phrases for term in phrase):
+            return np.array([], dtype=np.int64), np.array([], dtype=float)
+
+        docs, inverse = np.unique(np.concatenate([docs for docs, _ in matched]), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate([weights for _, weights in matched]))
+
+        in_range = (docs >= lo) & (docs < hi) if hi is not None else docs >= lo
+        docs, scores = docs[in_range], scores[in_range]
+
+        for phrase in phrases:
+            # Only documents holding every word of the phrase are checked for it in order
+            candidates = docs[np.isin(docs, self.postings[phrase[0]][0])]
+            for term in phrase[1:]:
+                candidates = candidates[np.isin(candidates, self.postings[term][0])]
+            keep = np.isin(docs, [doc_id for doc_id in candidates.tolist() if self.contains_phrase(doc_id, phrase)])
+            docs, scores = docs[keep], scores[keep]
+
+        order = np.argsort(-scores, kind='stable')
+        return docs[order], scores[order]
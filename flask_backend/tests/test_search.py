@@ -0,0 +1,72 @@
+import os
+import sys
+
+import nltk
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import main
+import utils
+from aviation.scripts import summary_clustering
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Every test starts without a search index and without a cached result of the NLTK data check
+    monkeypatch.setitem(utils.SEARCH_INDEX, 'version', None)
+    monkeypatch.setitem(utils.SEARCH_INDEX, 'index', None)
+    monkeypatch.setattr(summary_clustering, '_nltk_data_found', False)
+    return main.app.test_client()
+
+
+@pytest.fixture
+def no_nltk_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(nltk.data, 'path', [str(tmp_path)])
+
+
+def write_nltk_data(root):
+    """Write the smallest NLTK data directory the tokenizer, stopwords and lemmatizer load from"""
+    _, tokenizer_path = summary_clustering.TOKENIZER_RESOURCE
+    tokenizer_dir = root / tokenizer_path
+    tokenizer_dir.mkdir(parents=True)
+    for name in ['collocations.tab', 'sent_starters.txt', 'abbrev_types.txt', 'ortho_context.tab']:
+        (tokenizer_dir / name).touch()
+
+    stopwords_dir = root / 'corpora' / 'stopwords'
+    stopwords_dir.mkdir(parents=True)
+    (stopwords_dir / 'english').write_text('the\na\nof\n')
+
+    wordnet_dir = root / 'corpora' / 'wordnet'
+    wordnet_dir.mkdir(parents=True)
+    for name in ['lexnames', 'index.sense', 'index.noun', 'index.verb', 'index.adj', 'index.adv',
+                 'data.noun', 'data.verb', 'data.adv', 'noun.exc', 'verb.exc', 'adj.exc', 'adv.exc']:
+        (wordnet_dir / name).touch()
+    (wordnet_dir / 'data.adj').write_text('  1 WordNet 3.0 Copyright 2006 by Princeton University.\n')
+
+
+@pytest.mark.skipif(not hasattr(nltk.tokenize.punkt, 'PunktTokenizer'), reason="needs nltk 3.8.2 or later")
+def test_search_reports_missing_nltk_data(client, no_nltk_data):
+    response = client.get('/search?q=engine')
+
+    assert response.status_code == 503
+    assert 'punkt_tab' in response.get_json()['missing']
+
+    # Still unavailable, and still answered as JSON, on the next request
+    assert client.get('/search?q=engine').status_code == 503
+
+
+@pytest.mark.skipif(not hasattr(nltk.tokenize.punkt, 'PunktTokenizer'), reason="needs nltk 3.8.2 or later")
+def test_search_works_once_nltk_data_is_installed(client, tmp_path, no_nltk_data):
+    assert client.get('/search?q=engine').status_code == 503
+
+    write_nltk_data(tmp_path)
+    response = client.get('/search?q=engine fire&limit=5')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] > 0
+    assert 0 < len(body['results']) <= 5
+    assert all('engine' in result['summary'].lower() or 'fire' in result['summary'].lower()
+               for result in body['results'])
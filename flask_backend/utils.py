@@ -1,33 +1,318 @@
 import pandas as pd
-import csv
 import json
 import os
 import sys
 import numpy as np
 import math
-from flask import request, jsonify
+from flask import request, jsonify, make_response, Response
+# The clustering stack (sklearn, nltk) and geopy are heavy, so they are imported where they are first used
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from aviation.scripts.summary_clustering import clustering_main
-import re
-from geopy.geocoders import Nominatim
+from search import InvertedIndex
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
 import time
-from functools import lru_cache
+import hashlib
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'planecrash_data'))
+
+DATASET_FILES = {
+    'accidents': 'planecrash_dataset_with_operator_country.csv',
+    'accidents_with_manufacturers': 'planecrash_dataset_with_manufacturers.csv',
+    'accidents_with_specs': 'accidents_with_specs.csv',
+    'manufacturers': 'manufacturer_list.csv',
+}
+
+# Accidents with geocoded crash and route coordinates already joined in (see buildLocations.py to write it),
+# and the hashes of the files it was built from
+ACCIDENTS_WITH_LOCATIONS_FILE = 'planecrash_dataset_with_locations.csv'
+LOCATION_SOURCES_FILE = 'planecrash_dataset_with_locations.sources.json'
+GEOCODED_LOCATIONS_FILE = 'geocoded_locations.csv'
+
+LOCATION_COLUMNS = ['Latitude', 'Longitude', 'Origin', 'Destination',
+                    'Origin_Lat', 'Origin_Lng', 'Destination_Lat', 'Destination_Lng']
+
+# Global registry of parsed datasets, filled once by load_datasets() so requests never read from disk
+DATASETS = {}
+
+# Content hash and modification time of every loaded file, used for ETag / Last-Modified headers
+DATASET_VERSIONS = {}
+DATASET_MODIFIED = {}
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def record_dataset_version(name, path):
+    DATASET_VERSIONS[name] = file_sha1(path)
+    DATASET_MODIFIED[name] = datetime.fromtimestamp(int(os.path.getmtime(path)), tz=timezone.utc)
+
+def get_data_version():
+    combined = hashlib.sha1()
+    for name in sorted(DATASET_VERSIONS):
+        combined.update(f"{name}={DATASET_VERSIONS[name]};".encode())
+    return combined.hexdigest()
+
+def get_data_last_modified():
+    return max(DATASET_MODIFIED.values(), default=None)
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.arrow'
+
+def read_table(csv_path, version_name=None):
+    # Prefer the memory-mapped Arrow copy written by convert_datasets_to_arrow() unless it is missing or stale
+    arrow_path = columnar_path(csv_path)
+    use_arrow = (feather is not None and os.path.exists(arrow_path)
+                 and (not os.path.exists(csv_path) or os.path.getmtime(arrow_path) >= os.path.getmtime(csv_path)))
+
+    if use_arrow:
+        table = feather.read_table(arrow_path, memory_map=True)
+        df = table.to_pandas(split_blocks=True)
+        # Arrow nulls come back as None in text columns, keep them as NaN like read_csv does. Only columns
+        # Arrow reports nulls in are touched, using its own null mask rather than a frame-wide notna() pass
+        for name, column in zip(table.column_names, table.columns):
+            if column.null_count and df[name].dtype == object:
+                df[name] = np.where(column.is_null().to_numpy(zero_copy_only=False), np.nan, df[name].to_numpy())
+        source_path = arrow_path
+    else:
+        df = pd.read_csv(csv_path)
+        source_path = csv_path
 
-def extract_leading_int(value):
-    if pd.notna(value):
-        match = re.match(r'\s*(\d+)', str(value))
-        if match:
-            return int(match.group(1))
-    return 0
+    if version_name is not None:
+        record_dataset_version(version_name, source_path)
+    return df
 
-def get_operator_country_amount_by_range(start_date, end_date):
-    df = pd.read_csv('../planecrash_data/planecrash_dataset_with_operator_country.csv')
-    df['Date'] = pd.to_datetime(df['Date'], format='%B %d, %Y')
+# Only needs to be ran after the CSVs change (see buildColumnar.py to run).
+def convert_datasets_to_arrow(data_dir=DATA_DIR):
+    if feather is None:
+        raise ImportError("pyarrow is required to write the columnar dataset files")
 
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
+    for file_name in sorted(os.listdir(data_dir)):
+        if not file_name.endswith('.csv'):
+            continue
+        csv_path = os.path.join(data_dir, file_name)
+        try:
+            df = pd.read_csv(csv_path)
+        except (UnicodeDecodeError, pd.errors.ParserError) as e:
+            print(f"Skipping {file_name}: {e}")
+            continue
+        feather.write_feather(df, columnar_path(csv_path), compression='uncompressed')
+        print(f"Converted {file_name} ({len(df)} rows)")
+
+def load_datasets():
+    global DATASETS
+
+    datasets = {}
+    for name, file_name in DATASET_FILES.items():
+        path = accidents_file() if name == 'accidents' else os.path.join(DATA_DIR, file_name)
+        datasets[name] = read_table(path, version_name=name)
+
+    # Presort accidents by an integer day key so date ranges become two binary searches
+    accidents = datasets['accidents']
+    accidents['Parsed_Date'] = pd.to_datetime(accidents['Date'], format='%B %d, %Y')
+    accidents['Day_Key'] = to_day_key(accidents['Parsed_Date'])
+    accidents['Accident_ID'] = np.arange(len(accidents))
+    fill_operator_countries(accidents)
+    datasets['accidents'] = accidents.sort_values(['Day_Key', 'Accident_ID']).reset_index(drop=True)
+
+    specs = datasets['accidents_with_specs']
+    specs['Similarity_Score'] = pd.to_numeric(specs['Similarity_Score'], errors='coerce')
+    datasets['spec_matched'] = build_spec_matched_view(specs)
+
+    DATASETS = datasets
+    print(f"Loaded {len(DATASETS)} datasets into memory")
+
+@lru_cache(maxsize=1)
+def get_registration_resolver():
+    from aviation.scripts.registration_prefixes import RegistrationResolver
+    return RegistrationResolver.from_csv(os.path.join(DATA_DIR, 'registration_prefixes.csv'))
+
+def fill_operator_countries(accidents):
+    # Records ingested since the operator country stage last ran have no country yet
+    missing = accidents['Operator Country'].isna().to_numpy() if 'Operator Country' in accidents else np.ones(len(accidents), dtype=bool)
+    if not missing.any():
+        return
+    countries = get_registration_resolver().resolve_many(accidents.loc[missing, 'Registration'], accidents.loc[missing, 'Year'])
+    resolved = np.flatnonzero(missing)[countries.notna().to_numpy()]
+    if len(resolved):
+        accidents.loc[accidents.index[resolved], 'Operator Country'] = countries.dropna().to_numpy()
+        print(f"Resolved the operator country of {len(resolved)} new accidents")
+
+def get_dataset(name):
+    return DATASETS[name]
+
+def location_source_hashes():
+    names = [DATASET_FILES['accidents'], GEOCODED_LOCATIONS_FILE]
+    return {name: file_sha1(os.path.join(DATA_DIR, name)) if os.path.exists(os.path.join(DATA_DIR, name)) else None
+            for name in names}
+
+def accidents_file():
+    # Use the copy with location columns only if it was built from the current accidents and geocoding cache.
+    # This compares content hashes, since a git checkout does not preserve modification times
+    source = os.path.join(DATA_DIR, DATASET_FILES['accidents'])
+    materialized = os.path.join(DATA_DIR, ACCIDENTS_WITH_LOCATIONS_FILE)
+    sources_file = os.path.join(DATA_DIR, LOCATION_SOURCES_FILE)
+    if not os.path.exists(materialized) or not os.path.exists(sources_file):
+        return source
+    with open(sources_file, 'r') as f:
+        recorded = json.load(f)
+    if recorded != location_source_hashes():
+        print(f"{ACCIDENTS_WITH_LOCATIONS_FILE} was built from other accidents or geocoding data, "
+              f"computing location columns at load time")
+        return source
+    return materialized
+
+def conditional_get(view):
+    # Answer with 304 before running the view when the client already has this data version
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag_source = f"{get_data_version()}|{request.path}|{sorted(request.args.items(multi=True))}"
+        etag = hashlib.sha1(etag_source.encode()).hexdigest()
+        last_modified = get_data_last_modified()
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = (request.if_modified_since is not None and last_modified is not None
+                            and last_modified <= request.if_modified_since)
+
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+def parse_page_args(args):
+    # An empty fields list means the endpoint's default fields, like leaving the parameter out
+    fields = args.get('fields')
+    if fields is not None:
+        fields = [field.strip() for field in fields.split(',') if field.strip()] or None
+
+    limit = args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) == 0:
+            raise ValueError("limit must be a positive integer")
+        limit = int(limit)
+
+    cursor = args.get('cursor')
+    if cursor is not None:
+        cursor = parse_cursor(cursor)
+
+    return fields, limit, cursor
+
+def parse_cursor(cursor):
+    # Cursors encode the (Day_Key, Accident_ID) sort key of the last row of the previous page
+    try:
+        day_key, accident_id = cursor.split(':')
+        return int(day_key), int(accident_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def make_cursor(row):
+    return f"{row['Day_Key']}:{row['Accident_ID']}"
+
+def slice_after_cursor(df, cursor):
+    if cursor is None:
+        return df
+
+    day_key, accident_id = cursor
+    day_keys = df['Day_Key'].to_numpy()
+    day_start = np.searchsorted(day_keys, day_key, side='left')
+    day_end = np.searchsorted(day_keys, day_key, side='right')
+    day_ids = df['Accident_ID'].to_numpy()[day_start:day_end]
+    return df.iloc[day_start + np.searchsorted(day_ids, accident_id, side='right'):]
+
+def select_page(keep, limit):
+    # Trim the keep mask to the first `limit` kept rows, returning the last row's position if more rows follow
+    if limit is None:
+        return keep, None
+
+    kept_positions = np.flatnonzero(keep)
+    if len(kept_positions) <= limit:
+        return keep, None
+
+    keep = keep.copy()
+    keep[kept_positions[limit]:] = False
+    return keep, kept_positions[limit - 1]
+
+def check_fields(fields, available_fields):
+    if fields is None:
+        return list(available_fields)
+
+    unknown_fields = [field for field in fields if field not in available_fields]
+    if unknown_fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown_fields)}")
+    return fields
+
+def with_next_cursor(body, next_cursor):
+    response = make_response(body)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def classify_weight_column(weights):
+    weight_classes = np.select(
+        [weights > 255000, weights > 41000, weights > 12500],
+        ["Heavy", "Large", "Medium"],
+        default="Small"
+    )
+    return pd.Series(weight_classes, index=weights.index).where(weights.notna())
+
+def build_spec_matched_view(specs):
+    # Spec rows sorted by similarity (best first) with the columns the spec endpoints derive,
+    # so any similarity threshold is a prefix of this table
+    view = specs.sort_values('Similarity_Score', ascending=False, kind='stable')
+
+    view['Weight_Class'] = classify_weight_column(view['MTOW_lb'])
+    view['Wingspan_ft'] = view['Wingspan_ft_without_winglets_sharklets'].fillna(
+        view['Wingspan_ft_with_winglets_sharklets']
+    )
+    view['Passengers'] = pd.to_numeric(view['Aboard'].str.extract(r"passengers:\s*(\d+|\?)", expand=False), errors='coerce')
+    view['Crew'] = pd.to_numeric(view['Aboard'].str.extract(r"crew:\s*(\d+|\?)", expand=False), errors='coerce')
+    return view
+
+def get_spec_matched(min_similarity=75):
+    view = get_dataset('spec_matched')
+    # Scores are descending, so search the negated (ascending) scores for the cutoff
+    negated_scores = -view['Similarity_Score'].to_numpy()
+    cutoff = np.searchsorted(negated_scores, -min_similarity, side='right')
+    return view.iloc[:cutoff]
+
+def to_day_key(dates):
+    return dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def date_range_bounds(df, start_date, end_date):
+    # Accident dates have no time part, so round the bounds inwards to whole days; a missing bound is open
+    day_keys = df['Day_Key'].to_numpy()
+    lo, hi = 0, len(day_keys)
+    if start_date is not None:
+        start_key = to_day_key(pd.Series([pd.to_datetime(start_date).ceil('D')]))[0]
+        lo = np.searchsorted(day_keys, start_key, side='left')
+    if end_date is not None:
+        end_key = to_day_key(pd.Series([pd.to_datetime(end_date).floor('D')]))[0]
+        hi = np.searchsorted(day_keys, end_key, side='right')
+    return lo, hi
+
+def slice_by_date_range(df, start_date, end_date):
+    lo, hi = date_range_bounds(df, start_date, end_date)
+    return df.iloc[lo:hi]
 
-    filtered_df = df[(df['Date'] >= start_date) & (df['Date'] <= end_date)]
+def get_operator_country_amount_by_range(start_date, end_date):
+    filtered_df = slice_by_date_range(get_dataset('accidents'), start_date, end_date)
 
     country_counts = filtered_df['Operator Country'].value_counts().reset_index()
     country_counts.columns = ['Operator Country', 'Count']
@@ -37,18 +322,11 @@ def get_operator_country_amount_by_range(start_date, end_date):
     return result_json
 
 def get_list_of_manufacturers():
-    manufacturers = []
-
-    with open('../planecrash_data/manufacturer_list.csv', mode='r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)
-        for row in reader:
-            manufacturers.append(row[0])
-    return manufacturers
+    return get_dataset('manufacturers')['Manufacturer'].tolist()
 
 def get_number_of_accidents():
-    accidents_df = pd.read_csv('../planecrash_data/planecrash_dataset_with_manufacturers.csv')
-    manufacturers_df = pd.read_csv('../planecrash_data/manufacturer_list.csv')
+    accidents_df = get_dataset('accidents_with_manufacturers')
+    manufacturers_df = get_dataset('manufacturers')
     accidents_df = accidents_df.dropna(subset=['Year', 'Manufacturer'])
     accidents_df['Year'] = accidents_df['Year'].astype(int)
     accidents_df['5_year_group'] = (accidents_df['Year'] // 5) * 5
@@ -66,8 +344,8 @@ def get_number_of_accidents():
     return json_result
 
 def get_number_of_accidents_per_year():
-    crashes_df = pd.read_csv("../planecrash_data/planecrash_dataset_with_manufacturers.csv")
-    manufacturers_df = pd.read_csv("../planecrash_data/manufacturer_list.csv")
+    crashes_df = get_dataset('accidents_with_manufacturers')
+    manufacturers_df = get_dataset('manufacturers')
     
     # Get list of all unique manufacturers
     all_manufacturers = manufacturers_df['Manufacturer'].tolist()
@@ -92,59 +370,127 @@ def get_number_of_accidents_per_year():
     
     return json.dumps(result, indent=2)
 
+CLUSTER_INPUT_FILE = os.path.join(DATA_DIR, 'planecrash_dataset_with_operator_country.csv')
+CLUSTERED_CSV_FILE = os.path.join(DATA_DIR, 'aircraft_crashes_clustered.csv')
+CLUSTER_OUTPUT_JSON_FILE = os.path.join(DATA_DIR, 'clustering_output.json')
+CLUSTER_POINTS_FILE = os.path.join(DATA_DIR, 'clustering_points.json')
+CLUSTER_EMBEDDINGS_FILE = os.path.join(DATA_DIR, 'clustering_embeddings.npz')
+
+# Serialized /api/cluster-data response, rebuilt only when the clustering output files change
+CLUSTER_RESPONSE_CACHE = {'version': None, 'body': None}
+
+# Regeneration jobs by id, run one at a time in a separate process so requests never wait on clustering
+CLUSTER_JOBS = {}
+CLUSTER_JOBS_LOCK = threading.Lock()
+_cluster_executor = None
+
+# Finished jobs can be polled for this long, and only the most recent ones are kept at all
+CLUSTER_JOB_TTL_SECONDS = 3600
+MAX_FINISHED_CLUSTER_JOBS = 20
+
+def prune_cluster_jobs():
+    # Caller holds CLUSTER_JOBS_LOCK
+    now = datetime.now(timezone.utc)
+    finished = sorted((job['finished_at'], job_id) for job_id, job in CLUSTER_JOBS.items()
+                      if job['finished_at'] is not None)
+    expired = [job_id for finished_at, job_id in finished
+               if (now - finished_at).total_seconds() > CLUSTER_JOB_TTL_SECONDS]
+    expired += [job_id for _, job_id in finished[:max(len(finished) - MAX_FINISHED_CLUSTER_JOBS, 0)]]
+    for job_id in set(expired):
+        del CLUSTER_JOBS[job_id]
+
+def run_clustering_job(input_file, output_json_file, clustered_csv_file, points_file, embeddings_file, refit=False):
+    # Write to temporary files first so the last good output keeps being served until this run succeeds
+    temp_json_file = output_json_file + '.tmp'
+    temp_csv_file = clustered_csv_file + '.tmp'
+    temp_points_file = points_file + '.tmp'
+    temp_embeddings_file = embeddings_file + '.tmp'
+    from aviation.scripts.summary_clustering import clustering_main
+
+    try:
+        # Without refit, only accidents missing from the current output are assigned with the saved model
+        clustering_main(input_file, temp_json_file, temp_csv_file, temp_points_file,
+                        refit=refit, previous_output_file=clustered_csv_file,
+                        embeddings_output_file=temp_embeddings_file)
+    except Exception:
+        for temp_file in (temp_json_file, temp_csv_file, temp_points_file, temp_embeddings_file):
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        raise
+    os.replace(temp_csv_file, clustered_csv_file)
+    os.replace(temp_points_file, points_file)
+    os.replace(temp_embeddings_file, embeddings_file)
+    os.replace(temp_json_file, output_json_file)
+
+def submit_cluster_job(refit=False):
+    global _cluster_executor
+
+    with CLUSTER_JOBS_LOCK:
+        prune_cluster_jobs()
+        # Coalesce with a regeneration of the same kind that is still queued or running
+        for job_id, job in CLUSTER_JOBS.items():
+            if not job['future'].done() and job['refit'] == refit:
+                return job_id
+
+        if _cluster_executor is None:
+            _cluster_executor = ProcessPoolExecutor(max_workers=1)
+
+        job_id = uuid.uuid4().hex
+        job = {'submitted_at': datetime.now(timezone.utc), 'finished_at': None, 'refit': refit}
+        job['future'] = _cluster_executor.submit(run_clustering_job, CLUSTER_INPUT_FILE, CLUSTER_OUTPUT_JSON_FILE,
+                                                 CLUSTERED_CSV_FILE, CLUSTER_POINTS_FILE, CLUSTER_EMBEDDINGS_FILE, refit)
+        job['future'].add_done_callback(lambda _: job.update(finished_at=datetime.now(timezone.utc)))
+        CLUSTER_JOBS[job_id] = job
+        return job_id
+
+def get_cluster_job_status(job_id):
+    with CLUSTER_JOBS_LOCK:
+        prune_cluster_jobs()
+        job = CLUSTER_JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown or expired job: {job_id}"}), 404
+
+    future = job['future']
+    status = {
+        "job_id": job_id,
+        "refit": job['refit'],
+        "submitted_at": job['submitted_at'].isoformat(),
+        "finished_at": job['finished_at'].isoformat() if job['finished_at'] else None
+    }
+
+    if not future.done():
+        status["status"] = "running" if future.running() else "queued"
+        status["elapsed_seconds"] = round((datetime.now(timezone.utc) - job['submitted_at']).total_seconds(), 1)
+    elif future.exception() is not None:
+        status["status"] = "failed"
+        status["error"] = str(future.exception())
+    else:
+        status["status"] = "finished"
+        with open(CLUSTER_OUTPUT_JSON_FILE, 'r') as f:
+            status["result"] = json.load(f)
+
+    return jsonify(status)
+
 def get_cluster_data():
-    print("testing")
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.abspath(os.path.join(base_dir, '..', 'planecrash_data'))
+    clustered_csv_file = CLUSTERED_CSV_FILE
+    output_json_file = CLUSTER_OUTPUT_JSON_FILE
 
-    input_file = os.path.join(data_dir, 'planecrash_dataset_with_operator_country.csv')
-    clustered_csv_file = os.path.join(data_dir, 'aircraft_crashes_clustered.csv')
-    output_json_file = os.path.join(data_dir, 'clustering_output.json')
-    
     # Check if the clustering output files exist
     regenerate = request.args.get('regenerate', 'false').lower() == 'true'
+    refit = request.args.get('refit', 'false').lower() == 'true'
     missing_output = not (os.path.exists(clustered_csv_file) and os.path.exists(output_json_file))
     
-    if regenerate or missing_output:
-        if not os.path.exists(input_file):
-            return jsonify({"error": f"Input file not found: {input_file}"}), 404
-        try:
-            clustering_main(input_file, output_json_file)
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return jsonify({"error": f"Error generating clustering data: {str(e)}"}), 500
+    if regenerate or refit or missing_output:
+        if not os.path.exists(CLUSTER_INPUT_FILE):
+            return jsonify({"error": f"Input file not found: {CLUSTER_INPUT_FILE}"}), 404
+        job_id = submit_cluster_job(refit)
+        return jsonify({
+            "job_id": job_id,
+            "status_url": f"/api/cluster-data/jobs/{job_id}"
+        }), 202
+
     try:
-        # Load clustered output
-        with open(output_json_file, 'r') as f:
-            cluster_data = json.load(f)
-
-        df = pd.read_csv(clustered_csv_file)
-
-        points = []
-        for _, row in df.iterrows():
-            points.append({
-                "x": float(row.get('x', 0)),
-                "y": float(row.get('y', 0)),
-                "kmeans_cluster": int(row.get('kmeans_cluster', 0)),
-                "kmeans_interpretation": row.get('kmeans_cluster_interpretation', "Unknown"),
-                "summary": row.get('Summary', ""),
-                "Year": int(row.get('Year', 0)) if pd.notna(row.get('Year')) else None,
-                "Date": str(row.get('Date', "")) if pd.notna(row.get('Date')) else None,
-                "location": str(row.get('Location', "")) if pd.notna(row.get('Location')) else None,
-                "aircraft_type": str(row.get('AC Type', "")) if pd.notna(row.get('AC Type')) else None,
-                "fatalities": int(row.get('Fatalities', 0)) if pd.notna(row.get('Fatalities')) and str(row.get('Fatalities')).isdigit() else None,
-                "operator": str(row.get('Operator', "")) if pd.notna(row.get('Operator')) else None,
-                "operator_country": str(row.get('Operator Country', "")) if pd.notna(row.get('Operator Country')) else "Unknown",
-                "date": str(row.get('Date', "")) if pd.notna(row.get('Date')) else None
-            })
-
-        distribution = df['kmeans_cluster_interpretation'].value_counts().to_dict()
-
-        cluster_data["points"] = points
-        cluster_data["kmeans"]["distribution"] = distribution
-
-        return jsonify(cluster_data)
+        return Response(load_cluster_response(), mimetype='application/json')
 
     except FileNotFoundError:
         return jsonify({"error": "Clustering data not found"}), 404
@@ -153,12 +499,145 @@ def get_cluster_data():
         traceback.print_exc()
         return jsonify({"error": f"Error reading clustering data: {str(e)}"}), 500
 
-def get_aircraft_specs():
-    df = pd.read_csv('../planecrash_data/accidents_with_specs.csv')
-    df['Similarity_Score'] = pd.to_numeric(df['Similarity_Score'], errors='coerce')
-    filtered_df = df[df['Similarity_Score'] >= 75]
+def load_cluster_response():
+    # Points come from the precomputed payload, or from the clustered CSV for outputs written before it existed
+    points_source = CLUSTER_POINTS_FILE if os.path.exists(CLUSTER_POINTS_FILE) else CLUSTERED_CSV_FILE
+    version = (os.path.getmtime(CLUSTER_OUTPUT_JSON_FILE), points_source, os.path.getmtime(points_source))
+    if CLUSTER_RESPONSE_CACHE['version'] == version:
+        return CLUSTER_RESPONSE_CACHE['body']
+
+    with open(CLUSTER_OUTPUT_JSON_FILE, 'r') as f:
+        cluster_data = json.load(f)
+
+    if points_source == CLUSTER_POINTS_FILE:
+        with open(CLUSTER_POINTS_FILE, 'r') as f:
+            points_data = json.load(f)
+    else:
+        from aviation.scripts.summary_clustering import build_cluster_points
+        df = pd.read_csv(CLUSTERED_CSV_FILE)
+        points_data = {
+            "columns": build_cluster_points(df),
+            "distribution": df['kmeans_cluster_interpretation'].value_counts().to_dict()
+        }
+
+    point_columns = points_data["columns"]
+    cluster_data["points"] = [dict(zip(point_columns, values)) for values in zip(*point_columns.values())]
+    cluster_data["kmeans"]["distribution"] = points_data["distribution"]
+
+    body = jsonify(cluster_data).get_data()
+    CLUSTER_RESPONSE_CACHE.update(version=version, body=body)
+    return body
 
-    # print(f"Number of records with Similarity_Score >= 75: {len(filtered_df)}")
+# Unit-length SVD embeddings for /api/similar, reloaded only when the embeddings file changes
+SIMILARITY_INDEX = {'version': None, 'stale': False, 'ids': None, 'positions': None, 'rows': None, 'matrix': None}
+
+SIMILAR_ACCIDENT_FIELDS = ['accident_id', 'date', 'operator', 'ac_type', 'fatalities', 'summary']
+
+def load_similarity_index():
+    version = (os.path.getmtime(CLUSTER_EMBEDDINGS_FILE), get_data_version())
+    if SIMILARITY_INDEX['version'] == version:
+        return SIMILARITY_INDEX
+
+    with np.load(CLUSTER_EMBEDDINGS_FILE) as data:
+        ids = data['accident_id']
+        embeddings = data['embedding'].astype(np.float32)
+        source_sha1 = str(data['source_sha1']) if 'source_sha1' in data.files else None
+
+    # Ids are row positions in the accidents file the clustering read, so they are only valid for that file
+    if source_sha1 != file_sha1(os.path.join(DATA_DIR, DATASET_FILES['accidents'])):
+        print("Accident embeddings were computed from a different accidents file, regenerate the clustering")
+        SIMILARITY_INDEX.update(version=version, stale=True, ids=None, positions=None, rows=None, matrix=None)
+        return SIMILARITY_INDEX
+
+    # Row of each embedded accident in the (date-sorted) accidents table; drop ids it does not have
+    accidents = get_dataset('accidents')
+    rows = pd.Series(np.arange(len(accidents)), index=accidents['Accident_ID']).reindex(ids)
+    known = rows.notna().to_numpy()
+    ids, embeddings, rows = ids[known], embeddings[known], rows[known].to_numpy(dtype=np.int64)
+
+    # With unit rows, cosine similarity to every accident is a single matrix-vector product
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    matrix = embeddings / np.where(norms > 0, norms, 1)
+
+    SIMILARITY_INDEX.update(version=version, stale=False, ids=ids, rows=rows, matrix=matrix,
+                            positions={accident_id: position for position, accident_id in enumerate(ids.tolist())})
+    return SIMILARITY_INDEX
+
+def get_similar_accidents(accident_id, k=10):
+    try:
+        index = load_similarity_index()
+    except FileNotFoundError:
+        return jsonify({"error": "Accident embeddings not found, regenerate the clustering first"}), 404
+    if index['stale']:
+        return jsonify({"error": "Accident embeddings are out of date with the accidents data, "
+                                 "regenerate the clustering first"}), 503
+
+    position = index['positions'].get(accident_id)
+    if position is None:
+        return jsonify({"error": f"No embedding for accident {accident_id}"}), 404
+
+    scores = index['matrix'] @ index['matrix'][position]
+    scores[position] = -np.inf
+    k = min(k, len(scores) - 1)
+
+    # Partition out the k best in linear time, then sort only those
+    top = np.argpartition(-scores, k - 1)[:k] if k > 0 else np.array([], dtype=np.int64)
+    top = top[np.argsort(-scores[top], kind='stable')]
+
+    rows = get_dataset('accidents').iloc[index['rows'][top]]
+    columns = accident_detail_columns(rows, SIMILAR_ACCIDENT_FIELDS)
+    columns['similarity'] = np.round(scores[top].astype(float), 4)
+    return jsonify({"accident_id": accident_id, "similar": records_from_columns(columns)})
+
+# Inverted index over the summaries, with documents in the row order of the date-sorted accidents table
+SEARCH_INDEX = {'version': None, 'index': None}
+SEARCH_INDEX_LOCK = threading.Lock()
+
+SEARCH_RESULT_FIELDS = ['accident_id', 'date', 'operator', 'ac_type', 'fatalities', 'summary']
+
+def search_tokens(text):
+    from aviation.scripts.summary_clustering import tokenize_text, lemmatize_token
+
+    # Same tokenization and lemmatization as the clustering, but stopwords are kept for phrase queries
+    return [lemmatize_token(token) for token in tokenize_text(text)]
+
+def get_search_index():
+    from aviation.scripts.summary_clustering import require_nltk_data
+
+    # Built on the first search rather than at startup, and again whenever the datasets change
+    with SEARCH_INDEX_LOCK:
+        version = get_data_version()
+        if SEARCH_INDEX['version'] != version:
+            # Raises MissingNLTKData before any summary is tokenized, and is checked again on the next search
+            require_nltk_data()
+            start = time.perf_counter()
+            index = InvertedIndex(get_dataset('accidents')['Summary'].tolist(), search_tokens)
+            SEARCH_INDEX.update(version=version, index=index)
+            print(f"Built search index over {len(index.doc_tokens)} summaries in {time.perf_counter() - start:.2f}s")
+        return SEARCH_INDEX['index']
+
+def search_accidents(query, start_date=None, end_date=None, limit=20):
+    accidents = get_dataset('accidents')
+    # Documents are date-sorted, so a date range is a contiguous range of document ids
+    lo, hi = date_range_bounds(accidents, start_date, end_date)
+    from aviation.scripts.summary_clustering import MissingNLTKData
+    try:
+        index = get_search_index()
+    except MissingNLTKData as e:
+        return jsonify({"error": "Search is unavailable until the NLTK data is installed: " + str(e),
+                        "missing": e.resources}), 503
+    doc_ids, scores = index.search(query, lo, hi)
+
+    rows = accidents.iloc[doc_ids[:limit]]
+    columns = accident_detail_columns(rows, SEARCH_RESULT_FIELDS)
+    columns['score'] = np.round(scores[:limit], 4)
+    return jsonify({"query": query, "total": len(doc_ids), "results": records_from_columns(columns)})
+
+def get_aircraft_specs(min_similarity=75, output_format='json'):
+    # Restore file order so the records come out as they appear in the dataset
+    filtered_df = get_spec_matched(min_similarity).sort_index()
+
+    # print(f"Number of records with Similarity_Score >= {min_similarity}: {len(filtered_df)}")
 
     columns_to_keep = [
         'ICAO_Code', 'FAA_Designator', 'Manufacturer', 'Model_FAA', 'Model_BADA',
@@ -174,13 +653,14 @@ def get_aircraft_specs():
         'Matched_Model_BADA', 'Similarity_Score'
     ]
 
+    if output_format == 'ndjson':
+        return stream_records_ndjson(filtered_df, columns_to_keep)
+
     filtered_df = filtered_df.reindex(columns=columns_to_keep)
     return filtered_df.to_json(orient='records', force_ascii=False)
 
-def get_accident_rate_per_engine_amount():
-    df = pd.read_csv('../planecrash_data/accidents_with_specs.csv')
-    df['Similarity_Score'] = pd.to_numeric(df['Similarity_Score'], errors='coerce')
-    filtered_df = df[df['Similarity_Score'] >= 75]
+def get_accident_rate_per_engine_amount(min_similarity=75):
+    filtered_df = get_spec_matched(min_similarity).sort_index()
 
     amount = filtered_df['Num_Engines'].value_counts()
 
@@ -188,50 +668,36 @@ def get_accident_rate_per_engine_amount():
 
     return amount_json
 
-def get_accident_rate_per_weight_class():
-    df = pd.read_csv('../planecrash_data/accidents_with_specs.csv')
-    df['Similarity_Score'] = pd.to_numeric(df['Similarity_Score'], errors='coerce')
-    filtered_df = df[df['Similarity_Score'] >= 75]
+def get_accident_rate_per_weight_class(min_similarity=75):
+    filtered_df = get_spec_matched(min_similarity)
 
-    weights = filtered_df['MTOW_lb'].dropna()
-
-    def classify_weight(w):
-        if w > 255000:
-            return "Heavy"
-        elif w > 41000:
-            return "Large"
-        elif w > 12500:
-            return "Medium"
-        else:
-            return "Small"
-
-    weight_classes = weights.apply(classify_weight)
-
-    counts = weight_classes.value_counts().to_dict()
+    counts = filtered_df['Weight_Class'].value_counts().to_dict()
 
     all_classes = ["Small", "Medium", "Large", "Heavy"]
     result = {cls: counts.get(cls, 0) for cls in all_classes}
 
     return json.dumps(result, indent=2)
 
+def stream_records_ndjson(df, columns, batch_size=500):
+    # Serialize one batch at a time so memory stays flat and the first bytes go out immediately
+    def generate():
+        for batch_start in range(0, len(df), batch_size):
+            batch = df.iloc[batch_start:batch_start + batch_size].reindex(columns=columns)
+            lines = batch.to_json(orient='records', lines=True, force_ascii=False)
+            yield lines if lines.endswith('\n') else lines + '\n'
 
-def get_accident_rate_per_wingspan_bin():
-    df = pd.read_csv("../planecrash_data/accidents_with_specs.csv")
-    df['Similarity_Score'] = pd.to_numeric(df['Similarity_Score'], errors='coerce')
-    filtered_df = df[df['Similarity_Score'] >= 75]
+    return Response(generate(), mimetype='application/x-ndjson')
 
-    wingspans = filtered_df["Wingspan_ft_without_winglets_sharklets"].fillna(
-        filtered_df["Wingspan_ft_with_winglets_sharklets"]
-    ).dropna().astype(float)
+def histogram_json_by_bin(values, bin_width=10):
+    if values.empty:
+        return json.dumps([], indent=2)
 
-    bin_width = 10
-
-    data_min = math.floor(wingspans.min() / bin_width) * bin_width
-    data_max = math.ceil(wingspans.max() / bin_width) * bin_width
+    data_min = math.floor(values.min() / bin_width) * bin_width
+    data_max = math.ceil(values.max() / bin_width) * bin_width
 
     bins = np.arange(data_min, data_max + bin_width, bin_width)
 
-    bin_counts, bin_edges = np.histogram(wingspans, bins=bins)
+    bin_counts, bin_edges = np.histogram(values, bins=bins)
 
     histogram_json = [
         {
@@ -245,70 +711,50 @@ def get_accident_rate_per_wingspan_bin():
     json_output = json.dumps(histogram_json, indent=2)
     return json_output
 
-def get_all_accident_data_without_summaries():
-    df = pd.read_csv('../planecrash_data/planecrash_dataset_with_operator_country.csv')
-    
-    columns_to_keep = [
-        'AC Type',
-        'Aboard',
-        'Date',
-        'Fatalities',
-        'Flight #',
-        'Ground',
-        'Location',
-        'Operator',
-        'Registration',
-        'Route',
-        'Time',
-        'Year',
-        'cn / ln',
-        'Operator Country'
-    ]
-    
-    available_columns = [col for col in columns_to_keep if col in df.columns]
-    filtered_df = df[available_columns]
+ACCIDENT_DATA_COLUMNS = [
+    'AC Type',
+    'Aboard',
+    'Date',
+    'Fatalities',
+    'Flight #',
+    'Ground',
+    'Location',
+    'Operator',
+    'Registration',
+    'Route',
+    'Time',
+    'Year',
+    'cn / ln',
+    'Operator Country'
+]
+
+def get_all_accident_data_without_summaries(output_format='json', fields=None, limit=None, cursor=None):
+    df = slice_after_cursor(get_dataset('accidents'), cursor)
+
+    available_columns = [col for col in ACCIDENT_DATA_COLUMNS if col in df.columns] + ['Accident_ID']
+    selected_columns = check_fields(fields, available_columns)
+    if fields is None:
+        selected_columns.remove('Accident_ID')
+
+    # Every row is kept, so a page is a positional slice and no copy of the table is made
+    next_cursor = None
+    if limit is not None and limit < len(df):
+        next_cursor = make_cursor(df.iloc[limit - 1])
+        df = df.iloc[:limit]
+
+    if output_format == 'ndjson':
+        return with_next_cursor(stream_records_ndjson(df, selected_columns), next_cursor)
+
+    filtered_df = df[selected_columns]
     
     result_json = filtered_df.to_json(orient='records', force_ascii=False)
-    return result_json
+    return with_next_cursor(result_json, next_cursor)
 
 
-def get_passenger_crew_aboard_boxplot():
-    df = pd.read_csv('../planecrash_data/accidents_with_specs.csv')
-    df['Similarity_Score'] = pd.to_numeric(df['Similarity_Score'], errors='coerce')
-    filtered_df = df[df['Similarity_Score'] >= 75]
-
-    def classify_weight(w):
-        if w > 255000:
-            return "Heavy"
-        elif w > 41000:
-            return "Large"
-        elif w > 12500:
-            return "Medium"
-        else:
-            return "Small"
+def get_passenger_crew_aboard_boxplot(min_similarity=75):
+    filtered_df = get_spec_matched(min_similarity).sort_index()
 
     filtered_df = filtered_df.dropna(subset=['MTOW_lb'])
-    filtered_df['Weight_Class'] = filtered_df['MTOW_lb'].apply(classify_weight)
-
-    filtered_df = filtered_df.dropna(subset=['MTOW_lb'])
-    filtered_df['Weight_Class'] = filtered_df['MTOW_lb'].apply(classify_weight)
-
-    def parse_aboard(aboard_str):
-        passengers, crew = np.nan, np.nan
-        if isinstance(aboard_str, str):
-            match_passengers = re.search(r"passengers:\s*(\d+|\?)", aboard_str)
-            match_crew = re.search(r"crew:\s*(\d+|\?)", aboard_str)
-            if match_passengers:
-                val = match_passengers.group(1)
-                passengers = int(val) if val.isdigit() else np.nan
-            if match_crew:
-                val = match_crew.group(1)
-                crew = int(val) if val.isdigit() else np.nan
-        return pd.Series({"Passengers": passengers, "Crew": crew})
-
-    parsed = filtered_df['Aboard'].apply(parse_aboard)
-    filtered_df = pd.concat([filtered_df, parsed], axis=1)
-
     filtered_df = filtered_df.dropna(subset=['Passengers', 'Crew'], how='all')
 
     output_data = {
@@ -324,85 +770,46 @@ def get_passenger_crew_aboard_boxplot():
     return output_data
 
 
-def get_accident_rate_per_wingspan_bin():
-    df = pd.read_csv("../planecrash_data/accidents_with_specs.csv")
-    df['Similarity_Score'] = pd.to_numeric(df['Similarity_Score'], errors='coerce')
-    filtered_df = df[df['Similarity_Score'] >= 75]
+def get_accident_rate_per_wingspan_bin(min_similarity=75):
+    filtered_df = get_spec_matched(min_similarity)
 
-    wingspans = filtered_df["Wingspan_ft_without_winglets_sharklets"].fillna(
-        filtered_df["Wingspan_ft_with_winglets_sharklets"]
-    ).dropna().astype(float)
+    wingspans = filtered_df["Wingspan_ft"].dropna().astype(float)
 
-    bin_width = 10
+    return histogram_json_by_bin(wingspans)
 
-    data_min = math.floor(wingspans.min() / bin_width) * bin_width
-    data_max = math.ceil(wingspans.max() / bin_width) * bin_width
 
-    bins = np.arange(data_min, data_max + bin_width, bin_width)
-
-    bin_counts, bin_edges = np.histogram(wingspans, bins=bins)
-
-    histogram_json = [
-        {
-            "bin_start": int(bin_edges[i]),
-            "bin_end": int(bin_edges[i + 1]),
-            "accident_count": int(bin_counts[i])
-        }
-        for i in range(len(bin_counts))
-    ]
-
-    json_output = json.dumps(histogram_json, indent=2)
-    return json_output
-
-
-def get_accident_rate_per_length_bin():
-    df = pd.read_csv("../planecrash_data/accidents_with_specs.csv")
-    df['Similarity_Score'] = pd.to_numeric(df['Similarity_Score'], errors='coerce')
-    filtered_df = df[df['Similarity_Score'] >= 75]
+def get_accident_rate_per_length_bin(min_similarity=75):
+    filtered_df = get_spec_matched(min_similarity)
 
     lengths = filtered_df["Length_ft"].dropna().astype(float)
 
-    bin_width = 10
-
-    data_min = math.floor(lengths.min() / bin_width) * bin_width
-    data_max = math.ceil(lengths.max() / bin_width) * bin_width
-
-    bins = np.arange(data_min, data_max + bin_width, bin_width)
-
-    bin_counts, bin_edges = np.histogram(lengths, bins=bins)
-
-    histogram_json = [
-        {
-            "bin_start": int(bin_edges[i]),
-            "bin_end": int(bin_edges[i + 1]),
-            "accident_count": int(bin_counts[i])
-        }
-        for i in range(len(bin_counts))
-    ]
-
-    json_output = json.dumps(histogram_json, indent=2)
-    return json_output
-geolocator = Nominatim(user_agent="aviation_crashes_app")
-
+    return histogram_json_by_bin(lengths)
 # Global variable to store geocoded data, if loading live it otherwise takes ~ 2-3 hours
 GEOCODED_CACHE = {}
 
+# Same cache laid out as an index plus coordinate array for whole-column lookups
+GEOCODED_INDEX = pd.Index([])
+GEOCODED_COORDS = np.empty((0, 2))
+
 def load_geocoded_cache():
-    global GEOCODED_CACHE
+    global GEOCODED_CACHE, GEOCODED_INDEX, GEOCODED_COORDS
     
-    geocoded_file = '../planecrash_data/geocoded_locations.csv'
-    if os.path.exists(geocoded_file):
-        geocoded_df = pd.read_csv(geocoded_file)
+    geocoded_file = os.path.join(DATA_DIR, GEOCODED_LOCATIONS_FILE)
+    if os.path.exists(geocoded_file) or os.path.exists(columnar_path(geocoded_file)):
+        geocoded_df = read_table(geocoded_file, version_name='geocoded_locations')
         GEOCODED_CACHE = dict(zip(geocoded_df['location'], 
                                  zip(geocoded_df['latitude'], geocoded_df['longitude'])))
+        GEOCODED_INDEX = pd.Index(list(GEOCODED_CACHE.keys()))
+        GEOCODED_COORDS = np.array(list(GEOCODED_CACHE.values()), dtype=float).reshape(-1, 2)
         print(f"Loaded {len(GEOCODED_CACHE)} cached locations")
     else:
         print("No geocoded cache found. Run build_geocoding_cache() first.")
 
 # Only needs to be ran once to build the geocoding cache if this does not exist (see buildGeocache.py to run).
-def build_geocoding_cache():
-    print("Building geocoding cache...")
-    df = pd.read_csv('../planecrash_data/planecrash_dataset_with_operator_country.csv')
+# Reruns resume from the saved output and only geocode locations that are missing or failed before.
+def geocoding_locations():
+    # Every crash location and route end of the accidents, as geocoding cache keys
+    df = pd.read_csv(os.path.join(DATA_DIR, 'planecrash_dataset_with_operator_country.csv'))
     
     unique_locations = set()
     
@@ -416,69 +823,35 @@ def build_geocoding_cache():
             unique_locations.add(origin)
         if destination:
             unique_locations.add(destination)
-    
+    return sorted(unique_locations)
+
+def build_geocoding_cache(geocoder=None, max_workers=4, rate=None, retry_failed=True):
+    from geocoding import NominatimGeocoder, build_location_cache
+
+    print("Building geocoding cache...")
+    unique_locations = geocoding_locations()
     print(f"Found {len(unique_locations)} unique locations to geocode")
-    
-    geocoded_locations = []
-    failed_locations = []
-    
-    for i, location in enumerate(unique_locations, 1):
-        print(f"Geocoding {i}/{len(unique_locations)}: {location}")
-        
-        lat, lng = geocode_location(location)
-        if lat and lng:
-            geocoded_locations.append({
-                'location': location,
-                'latitude': lat,
-                'longitude': lng
-            })
-        else:
-            failed_locations.append(location)
-        
-        # Rate limiting
-        time.sleep(0.1)
-        
-        # Save progress every 100 locations
-        if i % 100 == 0:
-            temp_df = pd.DataFrame(geocoded_locations)
-            temp_df.to_csv('../planecrash_data/geocoded_locations_temp.csv', index=False)
-            print(f"Saved progress: {len(geocoded_locations)} successful geocodes")
-    
-    final_df = pd.DataFrame(geocoded_locations)
-    final_df.to_csv('../planecrash_data/geocoded_locations.csv', index=False)
-    
-    
-    print(f"Geocoding complete!")
-    print(f"Successfully geocoded: {len(geocoded_locations)}")
-    print(f"Failed to geocode: {len(failed_locations)}")
-    
-    return final_df
 
-# Only used during cache building
-@lru_cache(maxsize=1000)
-def geocode_location(location_string):
-    if not location_string or pd.isna(location_string):
-        return None, None
-    
-    try:
-        location = str(location_string).strip()
-        location = re.sub(r'^(Near|Off|About)\s+', '', location, flags=re.IGNORECASE)
-        location = re.sub(r'\s+\(.*?\)$', '', location)
-        
-        result = geolocator.geocode(location, timeout=10)
-        
-        if result:
-            return result.latitude, result.longitude
-        else:
-            return None, None
-            
-    except Exception as e:
-        print(f"Geocoding error for '{location_string}': {e}")
-        return None, None
+    if geocoder is None:
+        geocoder = NominatimGeocoder()
+    if rate is None:
+        rate = geocoder.rate
+
+    return build_location_cache(unique_locations, os.path.join(DATA_DIR, GEOCODED_LOCATIONS_FILE),
+                                geocoder, max_workers=max_workers, rate=rate, retry_failed=retry_failed)
+
+def lookup_coordinates(locations):
+    # Geocoded coordinates of a whole column at once, NaN coordinates and found=False for misses
+    positions = GEOCODED_INDEX.get_indexer(locations)
+    found = positions >= 0
+    if len(GEOCODED_COORDS) == 0:
+        missing = np.full(len(positions), np.nan)
+        return missing, missing.copy(), found
 
-def get_coordinates(location):
-    global GEOCODED_CACHE
-    return GEOCODED_CACHE.get(location, (None, None))
+    coords = GEOCODED_COORDS[positions]
+    lat = np.where(found, coords[:, 0], np.nan)
+    lng = np.where(found, coords[:, 1], np.nan)
+    return lat, lng, found
 
 @lru_cache(maxsize=500)
 def parse_route(route_string):
@@ -500,97 +873,237 @@ def parse_route(route_string):
     
     return None, None
 
-def extract_leading_int(value):
-    if pd.notna(value):
-        match = re.match(r'\s*(\d+)', str(value))
-        if match:
-            return int(match.group(1))
-    return 0
-
-def get_crash_locations_data_optimized(start_date, end_date):
-    df = pd.read_csv('../planecrash_data/planecrash_dataset_with_operator_country.csv')
-    df['Date'] = pd.to_datetime(df['Date'], format='%B %d, %Y')
-
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
-
-    # Filter by date range
-    filtered_df = df[(df['Date'] >= start_date) & (df['Date'] <= end_date)].copy()
-    
-    crash_locations = []
-    
-    for idx, row in filtered_df.iterrows():
-        if pd.isna(row['Location']) or not str(row['Location']).strip():
-            continue
-            
-        location = str(row['Location']).strip()
-        
-        # Get coordinates from cache
-        lat, lng = get_coordinates(location)
-        
-        if lat and lng:
-            crash_data = {
-                'location': location,
-                'latitude': lat,
-                'longitude': lng,
-                'date': row['Date'].strftime('%Y-%m-%d') if pd.notna(row['Date']) else None,
-                'operator': row['Operator'] if pd.notna(row['Operator']) else 'Unknown',
-                'ac_type': row['AC Type'] if pd.notna(row['AC Type']) else 'Unknown',
-                'fatalities': extract_leading_int(row['Fatalities']),
-                'aboard': int(row['Aboard']) if pd.notna(row['Aboard']) and str(row['Aboard']).replace(' ', '').isdigit() else 0,
-                'flight_number': row['Flight #'] if pd.notna(row['Flight #']) else None,
-                'summary': row['Summary'] if pd.notna(row['Summary']) else None
-            }
-            crash_locations.append(crash_data)
-    
-    return jsonify(crash_locations)
-
-def get_flight_routes_data_optimized(start_date, end_date):
-    df = pd.read_csv('../planecrash_data/planecrash_dataset_with_operator_country.csv')
-    df['Date'] = pd.to_datetime(df['Date'], format='%B %d, %Y')
-
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
+def extract_leading_int_column(values):
+    leading = values.astype(str).str.extract(r'^\s*(\d+)', expand=False)
+    return leading.fillna('0').astype(np.int64)
+
+def extract_aboard_column(values):
+    compact = values.astype(str).str.replace(' ', '')
+    return compact.where(values.notna() & compact.str.isdigit(), '0').astype(np.int64)
+
+def none_if_missing(values):
+    return values.astype(object).where(values.notna(), None)
+
+def records_from_columns(columns):
+    keys = list(columns)
+    column_values = [values.tolist() for values in columns.values()]
+    return [dict(zip(keys, row)) for row in zip(*column_values)]
+
+ACCIDENT_DETAIL_COLUMNS = {
+    'date': lambda rows: none_if_missing(rows['Parsed_Date'].dt.strftime('%Y-%m-%d')),
+    'operator': lambda rows: rows['Operator'].where(rows['Operator'].notna(), 'Unknown'),
+    'ac_type': lambda rows: rows['AC Type'].where(rows['AC Type'].notna(), 'Unknown'),
+    'fatalities': lambda rows: extract_leading_int_column(rows['Fatalities']),
+    'aboard': lambda rows: extract_aboard_column(rows['Aboard']),
+    'flight_number': lambda rows: none_if_missing(rows['Flight #']),
+    'summary': lambda rows: none_if_missing(rows['Summary']),
+    'accident_id': lambda rows: rows['Accident_ID']
+}
+
+CRASH_LOCATION_FIELDS = ['location', 'latitude', 'longitude', 'date', 'operator', 'ac_type',
+                         'fatalities', 'aboard', 'flight_number', 'summary']
+
+FLIGHT_ROUTE_FIELDS = ['route_string', 'origin_city', 'destination_city', 'origin_lat', 'origin_lng',
+                       'destination_lat', 'destination_lng', 'date', 'operator', 'ac_type',
+                       'fatalities', 'aboard', 'flight_number', 'summary']
+
+def accident_detail_columns(rows, fields):
+    return {name: build(rows) for name, build in ACCIDENT_DETAIL_COLUMNS.items() if name in fields}
+
+def parse_bbox(bbox):
+    # Leaflet order: west,south,east,north
+    try:
+        west, south, east, north = [float(value) for value in bbox.split(',')]
+    except ValueError:
+        raise ValueError("bbox must be four numbers: west,south,east,north")
+    return west, south, east, north
+
+def in_bbox(lat, lng, bbox):
+    west, south, east, north = bbox
+    in_lat = (lat >= south) & (lat <= north)
+    if west <= east:
+        return in_lat & (lng >= west) & (lng <= east)
+    # The box crosses the antimeridian
+    return in_lat & ((lng >= west) | (lng <= east))
+
+def crash_location_records(filtered_df, fields=CRASH_LOCATION_FIELDS, limit=None, bbox=None):
+    # Coordinates are only filled in for mappable crashes (see add_location_columns)
+    lat = filtered_df['Latitude'].to_numpy()
+    lng = filtered_df['Longitude'].to_numpy()
+    keep = ~np.isnan(lat)
+    if bbox is not None:
+        keep &= in_bbox(lat, lng, bbox)
+    keep, last_position = select_page(keep, limit)
+
+    crash_columns = {
+        'location': filtered_df['Location'][keep].astype(str).str.strip(),
+        'latitude': lat[keep],
+        'longitude': lng[keep]
+    }
+    crash_columns.update(accident_detail_columns(filtered_df[keep], fields))
+    crash_columns = {name: crash_columns[name] for name in fields}
+
+    return records_from_columns(crash_columns), last_position
+
+def get_crash_locations_data_optimized(start_date, end_date, fields=None, limit=None, cursor=None):
+    fields = check_fields(fields, CRASH_LOCATION_FIELDS + ['accident_id']) if fields else CRASH_LOCATION_FIELDS
+
+    filtered_df = slice_by_date_range(get_dataset('accidents'), start_date, end_date)
+    filtered_df = slice_after_cursor(filtered_df, cursor)
+
+    crash_locations, last_position = crash_location_records(filtered_df, fields, limit)
+
+    next_cursor = make_cursor(filtered_df.iloc[last_position]) if last_position is not None else None
+    return with_next_cursor(jsonify(crash_locations), next_cursor)
+
+# Zoom levels below this are answered with grid clusters, from this level on with individual crashes
+FULL_POINTS_ZOOM = 10
+
+# Grid cells per 256px map tile, i.e. clusters are roughly 64px wide on screen
+GRID_CELLS_PER_TILE = 4
+
+# Latitude at which Web Mercator's y reaches the edge of the square world map
+MERCATOR_MAX_LAT = 85.0511287798
+
+# Cell id of every accident for each zoom level below FULL_POINTS_ZOOM, -1 when it has no coordinates
+CRASH_GRID = np.empty((FULL_POINTS_ZOOM, 0), dtype=np.int64)
+
+def add_location_columns(accidents):
+    # Crash coordinates, only for crashes with a non-empty, geocoded, non-zero location
+    locations = accidents['Location'].fillna('').astype(str).str.strip()
+    lat, lng, found = lookup_coordinates(locations)
+    mappable = (locations != '').to_numpy() & found & (lat != 0) & (lng != 0)
+    accidents['Latitude'] = np.where(mappable, lat, np.nan)
+    accidents['Longitude'] = np.where(mappable, lng, np.nan)
+
+    # Parse each distinct route once and broadcast the result back to the rows
+    route_strings = accidents['Route'][accidents['Route'].notna() & (accidents['Route'] != '')].astype(str).str.strip()
+    unique_routes = pd.Index(route_strings.unique())
+    parsed_routes = np.array([parse_route(route) for route in unique_routes], dtype=object).reshape(-1, 2)
+    route_positions = unique_routes.get_indexer(route_strings)
+    origins = pd.Series(parsed_routes[route_positions, 0], index=route_strings.index).reindex(accidents.index)
+    destinations = pd.Series(parsed_routes[route_positions, 1], index=route_strings.index).reindex(accidents.index)
+
+    # Route coordinates, only when both ends are geocoded to non-zero coordinates
+    origin_lat, origin_lng, origin_found = lookup_coordinates(origins)
+    dest_lat, dest_lng, dest_found = lookup_coordinates(destinations)
+    routable = (origins.notna() & destinations.notna()).to_numpy() & origin_found & dest_found
+    routable &= (origin_lat != 0) & (origin_lng != 0) & (dest_lat != 0) & (dest_lng != 0)
+
+    accidents['Origin'] = origins.where(origins.notna(), np.nan)
+    accidents['Destination'] = destinations.where(destinations.notna(), np.nan)
+    accidents['Origin_Lat'] = np.where(routable, origin_lat, np.nan)
+    accidents['Origin_Lng'] = np.where(routable, origin_lng, np.nan)
+    accidents['Destination_Lat'] = np.where(routable, dest_lat, np.nan)
+    accidents['Destination_Lng'] = np.where(routable, dest_lng, np.nan)
+    return accidents
+
+def ensure_location_columns():
+    accidents = get_dataset('accidents')
+    if not set(LOCATION_COLUMNS).issubset(accidents.columns):
+        print("Computing location columns at load time, run buildLocations.py to precompute them")
+        add_location_columns(accidents)
+
+# Only needs to be ran after the accidents or the geocoding cache change (see buildLocations.py to run).
+def build_location_columns():
+    sources = location_source_hashes()
+    load_geocoded_cache()
+    source = os.path.join(DATA_DIR, DATASET_FILES['accidents'])
+    accidents = add_location_columns(pd.read_csv(source))
+
+    output_file = os.path.join(DATA_DIR, ACCIDENTS_WITH_LOCATIONS_FILE)
+    accidents.to_csv(output_file + '.tmp', index=False)
+    os.replace(output_file + '.tmp', output_file)
+
+    # Written last, so an interrupted build never pairs a new hash record with an old output
+    sources_file = os.path.join(DATA_DIR, LOCATION_SOURCES_FILE)
+    with open(sources_file + '.tmp', 'w') as f:
+        json.dump(sources, f, indent=2, sort_keys=True)
+    os.replace(sources_file + '.tmp', sources_file)
+    print(f"Saved {int(accidents['Latitude'].notna().sum())} crash locations and "
+          f"{int(accidents['Origin_Lat'].notna().sum())} routes to {output_file}")
+
+def build_crash_grid():
+    global CRASH_GRID
+
+    accidents = get_dataset('accidents')
+    lat = accidents['Latitude'].to_numpy()
+    lng = accidents['Longitude'].to_numpy()
+    mappable = ~np.isnan(lat)
+
+    accidents['Fatality_Count'] = extract_leading_int_column(accidents['Fatalities'])
+
+    # Cells are square in Web Mercator like the map tiles, so rows are cut along the projected y in [-pi, pi]
+    x = np.radians(lng[mappable])
+    y = np.log(np.tan(np.pi / 4 + np.radians(np.clip(lat[mappable], -MERCATOR_MAX_LAT, MERCATOR_MAX_LAT)) / 2))
+
+    grid = np.full((FULL_POINTS_ZOOM, len(accidents)), -1, dtype=np.int64)
+    for zoom in range(FULL_POINTS_ZOOM):
+        n_columns = 2 ** zoom * GRID_CELLS_PER_TILE
+        cell_size = 2 * np.pi / n_columns
+        columns = np.clip(np.floor((x + np.pi) / cell_size), 0, n_columns - 1).astype(np.int64)
+        rows = np.clip(np.floor((y + np.pi) / cell_size), 0, n_columns - 1).astype(np.int64)
+        grid[zoom, mappable] = rows * n_columns + columns
+
+    CRASH_GRID = grid
+    print(f"Built crash grid for zoom levels 0-{FULL_POINTS_ZOOM - 1}")
+
+def get_crash_location_clusters(start_date, end_date, zoom, bbox=None):
+    filtered_df = slice_by_date_range(get_dataset('accidents'), start_date, end_date)
+
+    if zoom >= FULL_POINTS_ZOOM:
+        crash_locations, _ = crash_location_records(filtered_df, bbox=bbox)
+        return jsonify({"zoom": zoom, "aggregated": False, "points": crash_locations})
+
+    cells = CRASH_GRID[zoom, filtered_df.index.to_numpy()]
+    lat = filtered_df['Latitude'].to_numpy()
+    lng = filtered_df['Longitude'].to_numpy()
+    keep = cells >= 0
+    if bbox is not None:
+        keep &= in_bbox(lat, lng, bbox)
+
+    cell_ids, members = np.unique(cells[keep], return_inverse=True)
+    counts = np.bincount(members, minlength=len(cell_ids))
+    lat_sums = np.bincount(members, weights=lat[keep], minlength=len(cell_ids))
+    lng_sums = np.bincount(members, weights=lng[keep], minlength=len(cell_ids))
+    fatality_sums = np.bincount(members, weights=filtered_df['Fatality_Count'].to_numpy()[keep], minlength=len(cell_ids))
+
+    clusters = records_from_columns({
+        'latitude': lat_sums / counts,
+        'longitude': lng_sums / counts,
+        'count': counts,
+        'fatalities': fatality_sums.astype(np.int64)
+    })
+    return jsonify({"zoom": zoom, "aggregated": True, "clusters": clusters})
+
+def get_flight_routes_data_optimized(start_date, end_date, fields=None, limit=None, cursor=None):
+    fields = check_fields(fields, FLIGHT_ROUTE_FIELDS + ['accident_id']) if fields else FLIGHT_ROUTE_FIELDS
+
+    filtered_df = slice_by_date_range(get_dataset('accidents'), start_date, end_date)
+    filtered_df = slice_after_cursor(filtered_df, cursor)
+
+    # Routes are parsed and geocoded ahead of time, coordinates are only set when both ends are mappable
+    origin_lat = filtered_df['Origin_Lat'].to_numpy()
+    keep, last_position = select_page(~np.isnan(origin_lat), limit)
+
+    route_columns = {
+        'route_string': filtered_df['Route'][keep].astype(str).str.strip(),
+        'origin_city': filtered_df['Origin'][keep],
+        'destination_city': filtered_df['Destination'][keep],
+        'origin_lat': origin_lat[keep],
+        'origin_lng': filtered_df['Origin_Lng'].to_numpy()[keep],
+        'destination_lat': filtered_df['Destination_Lat'].to_numpy()[keep],
+        'destination_lng': filtered_df['Destination_Lng'].to_numpy()[keep]
+    }
+    route_columns.update(accident_detail_columns(filtered_df[keep], fields))
+    route_columns = {name: route_columns[name] for name in fields}
 
-    # Filter by date range
-    filtered_df = df[(df['Date'] >= start_date) & (df['Date'] <= end_date)].copy()
-    
-    route_df = filtered_df[filtered_df['Route'].notna() & (filtered_df['Route'] != '')].copy()
-    
-    flight_routes = []
-    
-    for idx, row in route_df.iterrows():
-        route_string = str(row['Route']).strip()
-        
-        # Parse the route
-        origin, destination = parse_route(route_string)
-        
-        if origin and destination:
-            # Get coordinates from cache
-            origin_lat, origin_lng = get_coordinates(origin)
-            dest_lat, dest_lng = get_coordinates(destination)
-            
-            if origin_lat and origin_lng and dest_lat and dest_lng:
-                route_data = {
-                    'route_string': route_string,
-                    'origin_city': origin,
-                    'destination_city': destination,
-                    'origin_lat': origin_lat,
-                    'origin_lng': origin_lng,
-                    'destination_lat': dest_lat,
-                    'destination_lng': dest_lng,
-                    'date': row['Date'].strftime('%Y-%m-%d') if pd.notna(row['Date']) else None,
-                    'operator': row['Operator'] if pd.notna(row['Operator']) else 'Unknown',
-                    'ac_type': row['AC Type'] if pd.notna(row['AC Type']) else 'Unknown',
-                    'fatalities': extract_leading_int(row['Fatalities']),
-                    'aboard': int(row['Aboard']) if pd.notna(row['Aboard']) and str(row['Aboard']).replace(' ', '').isdigit() else 0,
-                    'flight_number': row['Flight #'] if pd.notna(row['Flight #']) else None,
-                    'summary': row['Summary'] if pd.notna(row['Summary']) else None
-                }
-                flight_routes.append(route_data)
-    
-    return jsonify(flight_routes)
+    next_cursor = make_cursor(filtered_df.iloc[last_position]) if last_position is not None else None
+    return with_next_cursor(jsonify(records_from_columns(route_columns)), next_cursor)
 
-# Initialize the cache when the module is imported
+# Initialize the datasets and cache when the app starts
 def init_app():
+    load_datasets()
     load_geocoded_cache()
+    ensure_location_columns()
+    build_crash_grid()